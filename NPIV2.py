@@ -4,6 +4,8 @@ from tkinter import filedialog, messagebox
 import os
 from openpyxl import load_workbook
 import numpy as np
+from excel_processor_web import build_aggregate_reports, build_reconciliation, read_used_range
+from workbook_append import append_sheets
 
 class ExcelProcessor:
     def __init__(self):
@@ -14,6 +16,9 @@ class ExcelProcessor:
         self.workbook = None
         self.summary_lookup = {}
         self.order_quantity_lookup = {}
+        # Copy the original Summary sheet through unchanged (formatting, formulas,
+        # links) instead of re-writing its values; only possible for .xlsx files
+        self.keep_original_summary = True
         
     def select_file(self):
         """Open file dialog to select Excel file"""
@@ -60,8 +65,9 @@ class ExcelProcessor:
             except:
                 pass
             
-            # Try to read the first sheet of the order file
-            order_df = pd.read_excel(self.order_file_path, header=None)
+            # Read the first sheet of the order file, up to its last row with data
+            with pd.ExcelFile(self.order_file_path) as order_sheets:
+                order_df = read_used_range(order_sheets, order_sheets.sheet_names[0])
             
             # Find "Item" and "Order Quantity" columns with more flexible matching
             item_col = None
@@ -167,7 +173,7 @@ class ExcelProcessor:
         """Process Summary sheet and create lookup dictionary"""
         try:
             # Read Summary sheet
-            summary_df = pd.read_excel(self.file_path, sheet_name='Summary', header=None)
+            summary_df = read_used_range(self.workbook, 'Summary')
             
             # Find the table with "Issue Key" and "Summary" columns
             issue_key_row = None
@@ -254,8 +260,9 @@ class ExcelProcessor:
             try:
                 print(f"Processing sheet: {sheet_name}")
                 
-                # Read sheet without header to handle custom positioning
-                df = pd.read_excel(self.file_path, sheet_name=sheet_name, header=None)
+                # Read sheet without header to handle custom positioning, skipping
+                # formatted but empty rows and columns past the data
+                df = read_used_range(self.workbook, sheet_name)
                 
                 # Get values from B1 and B3 (0-indexed: B1 = [0,1], B2 = [1,1])
                 model_value = ""
@@ -372,20 +379,31 @@ class ExcelProcessor:
             # Combine all processed sheets
             combined_df = pd.concat(processed_sheets, ignore_index=True)
             
-            # Read original Summary sheet
-            summary_df = pd.read_excel(self.file_path, sheet_name='Summary')
-            
             # Create output file path
             base_name = os.path.splitext(self.file_path)[0]
             output_path = f"{base_name}_processed.xlsx"
             
-            # Save to new Excel file
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                # Save Summary sheet (unchanged)
-                summary_df.to_excel(writer, sheet_name='Summary', index=False)
+            # New sheets: combined data, aggregate reports (per Model, Planner and
+            # B2C Date) and reconciliation of unmatched items in both directions
+            reconciliation = build_reconciliation(combined_df, self.order_quantity_lookup)
+            new_sheets = {'Combined': combined_df}
+            new_sheets.update(build_aggregate_reports(combined_df))
+            new_sheets.update(reconciliation)
+            
+            if self.keep_original_summary and self.file_path.lower().endswith('.xlsx'):
+                # Copy the Summary sheet as stored and add only the new sheets
+                append_sheets(self.file_path, new_sheets, output_path, keep_sheets=['Summary'])
+            else:
+                # Read original Summary sheet
+                summary_df = read_used_range(self.workbook, 'Summary', header=0)
                 
-                # Save combined sheet
-                combined_df.to_excel(writer, sheet_name='Combined', index=False)
+                # Save to new Excel file
+                with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+                    # Save Summary sheet (values only)
+                    summary_df.to_excel(writer, sheet_name='Summary', index=False)
+                    
+                    for sheet_name, report_df in new_sheets.items():
+                        report_df.to_excel(writer, sheet_name=sheet_name, index=False)
             
             print(f"File saved successfully: {output_path}")
             print(f"Combined sheet contains {len(combined_df)} total rows")
@@ -394,6 +412,8 @@ class ExcelProcessor:
             ordered_qty_count = combined_df['Ordered Qty'].apply(lambda x: pd.notna(x) and str(x) != "" and str(x) != "0").sum()
             total_items = len(combined_df)
             print(f"Found ordered quantities for {ordered_qty_count} out of {total_items} items")
+            print(f"Unmatched sheet items: {len(reconciliation['Unmatched Sheet Items'])}, "
+                  f"order items not in any sheet: {len(reconciliation['Unmatched Order Items'])}")
             
             # Show some examples of matches/non-matches for debugging
             print("\nSample matching results:")
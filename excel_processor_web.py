@@ -1,103 +1,601 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List
+from io import BytesIO
+import os
+import sys
+import fnmatch
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Any, List, Iterable, Iterator, Tuple, Union, BinaryIO, Optional, Callable, Mapping
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+from header_mapping import ORDER_ITEM_COLUMN, ORDER_QUANTITY_COLUMN, build_header_matchers
+from workbook_append import append_sheets
+
+# Number of leading rows searched for the Summary sheet "Issue key" header
+SUMMARY_HEADER_SEARCH_ROWS = 50
+
+# Aggregate report sheets: output sheet name -> column grouped on
+AGGREGATE_REPORTS = {
+    'By Model': 'Model',
+    'By Planner': 'Planner',
+    'By B2C Date': 'B2C Date',
+}
+
+# Reconciliation report sheet names
+UNMATCHED_SHEET_ITEMS = 'Unmatched Sheet Items'
+UNMATCHED_ORDER_ITEMS = 'Unmatched Order Items'
+UNMATCHED_BY_SHEET = 'Unmatched by Sheet'
+
+# Memory budget for order lookups kept by the shared OrderLookupCache
+ORDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# A workbook given as a path or an open binary file-like object (e.g. an upload)
+ExcelSource = Union[str, os.PathLike, BinaryIO]
+
+# Supported output formats: file extension and MIME type
+OUTPUT_FORMATS = {
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('.csv', 'text/csv'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+class SheetFilter:
+    """Case-insensitive wildcard filters on sheet name and Model, plus a B2C Date range"""
+    
+    def __init__(self, model_pattern: Optional[str] = None, sheet_pattern: Optional[str] = None,
+                 b2c_date_from=None, b2c_date_to=None):
+        self.model_pattern = model_pattern.lower() if model_pattern else None
+        self.sheet_pattern = sheet_pattern.lower() if sheet_pattern else None
+        self.b2c_date_from = pd.Timestamp(b2c_date_from) if b2c_date_from else None
+        self.b2c_date_to = pd.Timestamp(b2c_date_to) if b2c_date_to else None
+    
+    def matches_sheet_name(self, sheet_name: str) -> bool:
+        """Check the sheet name pattern"""
+        return self.sheet_pattern is None or fnmatch.fnmatch(sheet_name.lower(), self.sheet_pattern)
+    
+    def matches_cells(self, model_value: str, b2c_date_value: str) -> bool:
+        """Check the Model pattern and B2C Date range"""
+        if self.model_pattern is not None and not fnmatch.fnmatch(model_value.lower(), self.model_pattern):
+            return False
+        
+        if self.b2c_date_from is None and self.b2c_date_to is None:
+            return True
+        
+        b2c_date = pd.to_datetime(b2c_date_value, errors='coerce')
+        if pd.isna(b2c_date):
+            return False
+        if self.b2c_date_from is not None and b2c_date < self.b2c_date_from:
+            return False
+        if self.b2c_date_to is not None and b2c_date > self.b2c_date_to:
+            return False
+        return True
+
+def open_source(source: ExcelSource) -> ExcelSource:
+    """Rewind a file-like source so it can be parsed from the start; paths pass through"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+def source_name(source: ExcelSource) -> str:
+    """Return a printable name for a path or file-like source"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, 'name', None) or '<in-memory file>'
+
+def content_hash(source: ExcelSource) -> str:
+    """Return a digest of a file's bytes; buffers are hashed in place without copying"""
+    digest = hashlib.blake2b(digest_size=16)
+    
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    elif hasattr(source, 'getbuffer'):
+        with source.getbuffer() as view:
+            digest.update(view)
+    else:
+        open_source(source)
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+        open_source(source)
+    
+    return digest.hexdigest()
+
+# Worksheet XML patterns used to find the last row holding a value without
+# parsing every cell
+_SHEET_DATA_TAG = re.compile(rb'<(\w+:)?sheetData[\s/>]')
+_ROW_NUMBER = re.compile(rb'\sr="(\d+)"')
+
+def _row_number_before(text: bytes, prefix: bytes, end: int) -> int:
+    """Number of the last complete <row> opening tag before end (0 if there is none)"""
+    tag = b'<' + prefix + b'row'
+    position = text.rfind(tag, 0, end)
+    while position >= 0:
+        close = text.find(b'>', position)
+        following = text[position + len(tag):position + len(tag) + 1]
+        if following and following in b' \t\r\n/>' and 0 <= close < end:
+            number = _ROW_NUMBER.search(text, position, close)
+            if number is None:
+                raise ValueError("Worksheet rows are not numbered")
+            return int(number.group(1))
+        position = text.rfind(tag, 0, position)
+    return 0
+
+def _last_value_row(worksheet) -> Optional[int]:
+    """Return the last row (1-based) holding a value from a raw scan of the sheet XML, or None"""
+    last_value_row = 0
+    current_row = 0
+    prefix = None
+    tail = b''
+    try:
+        with worksheet._get_source() as source:
+            for chunk in iter(lambda: source.read(4 * 1024 * 1024), b''):
+                # Keep a little overlap so tags split across chunks are still seen
+                text = tail + chunk
+                tail = text[-1024:]
+                
+                if prefix is None:
+                    sheet_data = _SHEET_DATA_TAG.search(text)
+                    if sheet_data is None:
+                        continue
+                    prefix = sheet_data.group(1) or b''
+                
+                # Values wholly inside the overlap were counted with the previous chunk
+                search_from = max(len(text) - len(chunk) - len(prefix) - 4, 0)
+                value_at = max(text.rfind(b'<' + prefix + b'v>', search_from),
+                               text.rfind(b'<' + prefix + b'is>', search_from))
+                if value_at >= 0:
+                    # A value before this chunk's first row tag belongs to the row carried over
+                    last_value_row = max(last_value_row, _row_number_before(text, prefix, value_at) or current_row)
+                current_row = _row_number_before(text, prefix, len(text)) or current_row
+    except Exception:
+        # worksheet._get_source() is a private openpyxl API (checked against openpyxl 3.1.5);
+        # if it changes, callers fall back to reading every row
+        return None
+    
+    return last_value_row
+
+def _excel_cell_value(cell) -> Any:
+    """Convert an openpyxl cell the way pd.read_excel does ("" marks an empty cell)"""
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+def read_used_range(workbook: pd.ExcelFile, sheet_name: str, skiprows: int = 0,
+                    nrows: Optional[int] = None, usecols: Optional[List[int]] = None,
+                    dtype=None, header: Optional[int] = None) -> pd.DataFrame:
+    """Read a sheet like pd.read_excel, skipping formatted but empty cells past the data"""
+    if workbook.engine != 'openpyxl':
+        return pd.read_excel(workbook, sheet_name=sheet_name, header=header, skiprows=skiprows,
+                             nrows=nrows, usecols=usecols, dtype=dtype)
+    
+    worksheet = workbook.book[sheet_name]
+    # The declared dimension (often A1:XFD1048576) is not trusted
+    worksheet.reset_dimensions()
+    max_col = max(usecols) + 1 if usecols else None
+    if nrows is not None:
+        # With a header row, nrows counts the data rows below it
+        max_row = skiprows + nrows + (header + 1 if header is not None else 0)
+    else:
+        # Stop openpyxl at the last row with a value instead of parsing the blank tail
+        max_row = _last_value_row(worksheet)
+        if max_row is not None and max_row <= skiprows:
+            return pd.DataFrame()
+    
+    data = []
+    last_row_with_data = -1
+    width = max_col or 0
+    for row in worksheet.iter_rows(min_row=skiprows + 1, max_row=max_row, max_col=max_col):
+        values = [_excel_cell_value(cell) for cell in row]
+        while values and values[-1] == "":
+            values.pop()
+        if values and (usecols is None or any(values[col] != "" for col in usecols if col < len(values))):
+            last_row_with_data = len(data)
+            width = max(width, len(values))
+        data.append(values)
+    
+    data = data[:last_row_with_data + 1]
+    if not data:
+        return pd.DataFrame()
+    
+    data = [values[:width] + [""] * (width - len(values)) for values in data]
+    try:
+        return TextParser(data, header=header, usecols=usecols, dtype=dtype, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+def fold_order_lookup(lookup: Mapping[str, float]) -> Dict[str, float]:
+    """Order lookup keyed by stripped, upper-cased item (first entry wins) for the fallback match"""
+    folded = {}
+    for lookup_item, lookup_qty in lookup.items():
+        folded.setdefault(lookup_item.strip().upper(), lookup_qty)
+    return folded
+
+class OrderLookupCache:
+    """Thread-safe LRU cache of read-only order lookups keyed by file content hash"""
+    
+    def __init__(self, max_bytes: int = ORDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # content hash -> ((lookup, folded lookup), estimated bytes)
+        self._loading = {}  # content hash -> lock held while that file is parsed
+        self._lock = threading.Lock()
+    
+    def get_or_load(self, source: ExcelSource, loader: Callable[[ExcelSource], Optional[Dict[str, float]]],
+                    variant: str = '') -> Optional[Tuple[Mapping[str, float], Mapping[str, float]]]:
+        """Return the cached (lookup, case-folded lookup) for source and variant, parsing on a miss"""
+        key = f"{content_hash(source)}:{variant}"
+        
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+        
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        
+        # Only one caller parses a given file; the others wait and reuse its result
+        with key_lock:
+            cached = self._get(key)
+            if cached is not None:
+                return cached
+            
+            try:
+                lookup = loader(source)
+                if lookup is None:
+                    return None
+                
+                # Store before releasing the key so late arrivals find the entry
+                folded = fold_order_lookup(lookup)
+                entry = (MappingProxyType(dict(lookup)), MappingProxyType(folded))
+                self._put(key, entry, self._estimate_size(lookup) + self._estimate_size(folded))
+                return entry
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return cache size and hit statistics"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+    
+    def _get(self, key: str) -> Optional[Tuple[Mapping[str, float], Mapping[str, float]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def _put(self, key: str, entry: Tuple[Mapping[str, float], Mapping[str, float]], size: int):
+        with self._lock:
+            self.misses += 1
+            if size > self.max_bytes:
+                return
+            
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self._entries[key] = (entry, size)
+            self.total_bytes += size
+            
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+    
+    @staticmethod
+    def _estimate_size(lookup: Dict[str, float]) -> int:
+        return sys.getsizeof(lookup) + sum(
+            sys.getsizeof(item) + sys.getsizeof(qty) for item, qty in lookup.items()
+        )
+
+# Process-wide cache shared by every ExcelProcessorWeb created with it
+SHARED_ORDER_CACHE = OrderLookupCache()
+
+def to_columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a copy of df with consistent column types for columnar formats"""
+    columnar_df = df.copy()
+    for col in columnar_df.columns:
+        if col == 'Ordered Qty':
+            columnar_df[col] = pd.to_numeric(columnar_df[col], errors='coerce')
+        elif columnar_df[col].dtype == object:
+            columnar_df[col] = columnar_df[col].astype('string')
+    return columnar_df
+
+def build_aggregate_reports(combined_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Total Ordered Qty against Oracle On Hand for each AGGREGATE_REPORTS key"""
+    ordered_qty = pd.to_numeric(combined_df['Ordered Qty'], errors='coerce')
+    on_hand = pd.to_numeric(combined_df['Oracle On Hand'], errors='coerce')
+    
+    measures = pd.DataFrame({
+        'Items': 1,
+        'Items with Order Qty': (ordered_qty.notna() & (ordered_qty != 0)).astype(int),
+        'Ordered Qty': ordered_qty.fillna(0),
+        'Oracle On Hand': on_hand.fillna(0),
+    }, index=combined_df.index)
+    
+    reports = {}
+    for sheet_name, key in AGGREGATE_REPORTS.items():
+        keys = combined_df[key].where(combined_df[key].notna(), "").astype(str).rename(key)
+        report = measures.groupby(keys, sort=True).sum().reset_index()
+        report['Ordered - On Hand'] = report['Ordered Qty'] - report['Oracle On Hand']
+        reports[sheet_name] = report
+    return reports
+
+def normalize_item_keys(items: pd.Series) -> pd.Series:
+    """Item numbers as compared by the order lookup: stripped and upper-cased"""
+    return items.where(items.notna(), "").astype(str).str.strip().str.upper()
+
+def build_reconciliation(combined_df: pd.DataFrame, order_lookup: Mapping[str, float]) -> Dict[str, pd.DataFrame]:
+    """Report sheet items with no order quantity and order items that appear in no sheet"""
+    order_items = pd.Series(list(order_lookup.keys()), dtype=object)
+    order_keys = normalize_item_keys(order_items)
+    sheet_keys = normalize_item_keys(combined_df['Item Number'])
+    has_item = sheet_keys != ""
+    
+    # Sheet rows whose item is missing from the order file
+    unmatched_rows = has_item & ~sheet_keys.isin(pd.Index(order_keys.unique()))
+    report_columns = [col for col in ["Source_Sheet", "Model", "Planner", "Item Number",
+                                      "Item Description", "Oracle On Hand"] if col in combined_df.columns]
+    unmatched_sheet_items = combined_df.loc[unmatched_rows, report_columns].reset_index(drop=True)
+    
+    # Order items that no sheet lists
+    unused_orders = ~order_keys.isin(pd.Index(sheet_keys[has_item].unique()))
+    unmatched_order_items = pd.DataFrame({
+        'Item': order_items[unused_orders].to_numpy(),
+        'Order Quantity': pd.Series(list(order_lookup.values()), dtype=float)[unused_orders].to_numpy(),
+    })
+    
+    # Per-sheet counts
+    counts = pd.DataFrame({
+        'Source_Sheet': combined_df['Source_Sheet'],
+        'Items': has_item.astype(int),
+        'Unmatched Items': unmatched_rows.astype(int),
+    }).groupby('Source_Sheet', sort=False).sum().reset_index()
+    counts['Unmatched %'] = (counts['Unmatched Items'] / counts['Items'].where(counts['Items'] > 0) * 100).fillna(0).round(1)
+    
+    return {
+        UNMATCHED_SHEET_ITEMS: unmatched_sheet_items,
+        UNMATCHED_ORDER_ITEMS: unmatched_order_items,
+        UNMATCHED_BY_SHEET: counts,
+    }
+
+def write_frame(df: pd.DataFrame, target, output_format: str = 'xlsx', sheet_name: str = 'Combined'):
+    """Write a single DataFrame to a path or binary buffer in the given format"""
+    if output_format == 'xlsx':
+        with pd.ExcelWriter(target, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    elif output_format == 'csv':
+        df.to_csv(target, index=False)
+    elif output_format == 'parquet':
+        to_columnar(df).to_parquet(target, index=False)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+def export_results(result: Dict[str, Any], output_format: str = 'xlsx', original: Optional[ExcelSource] = None,
+                   keep_sheets: Optional[Iterable[str]] = ('Summary',)) -> bytes:
+    """Serialize a process_files result; xlsx with original adds the new sheets to a copy of it"""
+    buffer = BytesIO()
+    
+    if output_format == 'xlsx' and original is not None:
+        new_sheets = {'Combined': result['combined_df']}
+        new_sheets.update(result.get('aggregate_reports', {}))
+        new_sheets.update(result.get('reconciliation', {}))
+        append_sheets(original, new_sheets, buffer, keep_sheets)
+    elif output_format == 'xlsx':
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            result['summary_df'].to_excel(writer, sheet_name='Summary', index=False)
+            result['combined_df'].to_excel(writer, sheet_name='Combined', index=False)
+            for sheet_name, report_df in result.get('aggregate_reports', {}).items():
+                report_df.to_excel(writer, sheet_name=sheet_name, index=False)
+            for sheet_name, report_df in result.get('reconciliation', {}).items():
+                report_df.to_excel(writer, sheet_name=sheet_name, index=False)
+    else:
+        write_frame(result['combined_df'], buffer, output_format)
+    
+    return buffer.getvalue()
 
 class ExcelProcessorWeb:
-    def __init__(self):
+    def __init__(self, order_cache: Optional[OrderLookupCache] = None, header_config: Optional[Dict[str, Any]] = None):
         self.summary_lookup = {}
         self.order_quantity_lookup = {}
+        self.order_cache = order_cache
+        # (lookup, case-folded copy) for the fallback item match
+        self._folded_lookup_cache = None
+        
+        # Header matchers compiled once from the config (see header_mapping)
+        header_matchers = build_header_matchers(header_config)
+        self.order_headers = header_matchers['order']
+        self.sheet_headers = header_matchers['sheet']
     
-    def process_files(self, main_file_path: str, order_file_path: str) -> Dict[str, Any]:
+    def process_files(self, main_file_path: ExcelSource, order_file_path: Optional[ExcelSource] = None,
+                      sheet_filter: Optional[SheetFilter] = None, summary_rows: Optional[int] = None) -> Dict[str, Any]:
         """Process both files and return results"""
-        try:
-            # Process order file
-            if not self._process_order_file(order_file_path):
+        processed_sheets = []
+        
+        for event in self.iter_process_files(main_file_path, order_file_path, sheet_filter, summary_rows):
+            if event['event'] == 'sheet':
+                processed_sheets.append(event['sheet_df'])
+            elif event['event'] == 'error':
                 return {
                     'success': False,
-                    'error': 'Failed to process order file - could not find Item and Order Quantity columns'
+                    'error': event['error']
                 }
-            
-            # Process main file
-            workbook = pd.ExcelFile(main_file_path)
-            
-            # Process summary sheet
-            self._process_summary_sheet(main_file_path)
-            
-            # Process other sheets
-            processed_sheets = self._process_other_sheets(main_file_path, workbook)
-            
-            if not processed_sheets:
+            else:
+                try:
+                    # Combine sheets
+                    combined_df = pd.concat(processed_sheets, ignore_index=True)
+                    aggregate_reports = build_aggregate_reports(combined_df)
+                    reconciliation = build_reconciliation(combined_df, self.order_quantity_lookup)
+                except Exception as e:
+                    return {
+                        'success': False,
+                        'error': f'Processing error: {str(e)}'
+                    }
+                
                 return {
+                    'success': True,
+                    'combined_df': combined_df,
+                    'summary_df': event['summary_df'],
+                    'aggregate_reports': aggregate_reports,
+                    'reconciliation': reconciliation,
+                    'total_items': event['total_items'],
+                    'matched_items': event['matched_items'],
+                    'match_rate': event['match_rate']
+                }
+    
+    def iter_process_files(self, main_file_path: ExcelSource, order_file_path: Optional[ExcelSource] = None,
+                           sheet_filter: Optional[SheetFilter] = None,
+                           summary_rows: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Process both files, yielding a 'sheet' event per sheet, then 'summary' or 'error'"""
+        try:
+            # Process order file
+            if order_file_path is not None and not self._process_order_file(order_file_path):
+                yield {
+                    'event': 'error',
                     'success': False,
-                    'error': 'No sheets were processed successfully - check if your main file has the required columns'
+                    'error': 'Failed to process order file - could not find Item and Order Quantity columns'
                 }
+                return
             
-            # Combine sheets
-            combined_df = pd.concat(processed_sheets, ignore_index=True)
-            summary_df = pd.read_excel(main_file_path, sheet_name='Summary')
-            
-            # Calculate statistics
-            ordered_qty_count = combined_df['Ordered Qty'].apply(
-                lambda x: pd.notna(x) and str(x) != "" and str(x) != "0"
-            ).sum()
-            total_items = len(combined_df)
+            # Process main file, opening the workbook once for all sheets
+            with pd.ExcelFile(open_source(main_file_path)) as workbook:
+                
+                # Process summary sheet
+                self._process_summary_sheet(workbook)
+                
+                # Process other sheets one at a time
+                sheets_processed = 0
+                total_items = 0
+                ordered_qty_count = 0
+                
+                for sheet_name, sheet_df in self._iter_other_sheets(workbook, sheet_filter):
+                    sheet_matched = self._count_ordered_items(sheet_df)
+                    sheets_processed += 1
+                    total_items += len(sheet_df)
+                    ordered_qty_count += sheet_matched
+                    
+                    yield {
+                        'event': 'sheet',
+                        'sheet_name': sheet_name,
+                        'sheet_df': sheet_df,
+                        'total_items': len(sheet_df),
+                        'matched_items': sheet_matched,
+                        'match_rate': (sheet_matched / len(sheet_df) * 100) if len(sheet_df) > 0 else 0
+                    }
+                
+                if sheets_processed == 0:
+                    if sheet_filter is not None:
+                        error = 'No sheets matched the filters - check the Model, B2C Date and sheet name filters'
+                    else:
+                        error = 'No sheets were processed successfully - check if your main file has the required columns'
+                    yield {
+                        'event': 'error',
+                        'success': False,
+                        'error': error
+                    }
+                    return
+                
+                summary_df = read_used_range(workbook, 'Summary', nrows=summary_rows, header=0)
             match_rate = (ordered_qty_count / total_items * 100) if total_items > 0 else 0
             
-            return {
+            yield {
+                'event': 'summary',
                 'success': True,
-                'combined_df': combined_df,
                 'summary_df': summary_df,
+                'sheets_processed': sheets_processed,
                 'total_items': total_items,
-                'matched_items': int(ordered_qty_count),
+                'matched_items': ordered_qty_count,
                 'match_rate': match_rate
             }
             
         except Exception as e:
-            return {
+            yield {
+                'event': 'error',
                 'success': False,
                 'error': f'Processing error: {str(e)}'
             }
     
-    def _process_order_file(self, order_file_path: str) -> bool:
+    def load_order_file(self, order_file_path: ExcelSource) -> bool:
+        """Parse an order file into the quantity lookup used by later runs"""
+        return self._process_order_file(order_file_path)
+    
+    @staticmethod
+    def _count_ordered_items(df: pd.DataFrame) -> int:
+        """Count rows that received a non-empty, non-zero Ordered Qty"""
+        return int(df['Ordered Qty'].apply(
+            lambda x: pd.notna(x) and str(x) != "" and str(x) != "0"
+        ).sum())
+    
+    def _process_order_file(self, order_file_path: ExcelSource) -> bool:
         """Process the order file to create quantity lookup"""
         try:
-            print(f"Processing order file: {order_file_path}")
-            
-            # Read the order file
-            order_df = pd.read_excel(order_file_path, header=None)
+            if self.order_cache is not None:
+                entry = self.order_cache.get_or_load(
+                    order_file_path, self._read_order_lookup, self.order_headers.fingerprint
+                )
+                if entry is None:
+                    return False
+                # Share the cache's folded copy instead of building one per processor
+                lookup, folded_lookup = entry
+                self._folded_lookup_cache = (lookup, folded_lookup)
+            else:
+                lookup = self._read_order_lookup(order_file_path)
+        except Exception as e:
+            print(f"Error processing order file: {str(e)}")
+            return False
+        
+        if lookup is None:
+            return False
+        
+        self.order_quantity_lookup = lookup
+        return True
+    
+    def _read_order_lookup(self, order_file_path: ExcelSource) -> Optional[Dict[str, float]]:
+        """Parse the order file into an item -> total order quantity dictionary"""
+        try:
+            print(f"Processing order file: {source_name(order_file_path)}")
             
-            # Find columns
-            item_col = None
-            order_qty_col = None
-            header_row = None
+            # Read the first sheet of the order file, up to its last row with data
+            with pd.ExcelFile(open_source(order_file_path)) as order_workbook:
+                order_df = read_used_range(order_workbook, order_workbook.sheet_names[0])
             
             print("Searching for Item and Order Quantity columns...")
             
-            # Search for column headers with flexible matching
-            for row_idx in range(min(15, len(order_df))):
-                for col_idx in range(len(order_df.columns)):
-                    if pd.notna(order_df.iloc[row_idx, col_idx]):
-                        cell_value = str(order_df.iloc[row_idx, col_idx]).strip().lower()
-                        
-                        # More flexible item column matching
-                        if cell_value in ["item", "item number", "item_number", "itemNumber", "part", "part number", "part_number", "partNumber"]:
-                            item_col = col_idx
-                            header_row = row_idx
-                            print(f"Found item column '{cell_value}' at row {row_idx}, col {col_idx}")
-                        
-                        # More flexible quantity column matching
-                        elif cell_value in ["order quantity", "order qty", "ordered quantity", "quantity", "qty", "order_quantity", "ordered_qty"]:
-                            order_qty_col = col_idx
-                            header_row = row_idx
-                            print(f"Found quantity column '{cell_value}' at row {row_idx}, col {col_idx}")
-                
-                # If we found both columns, break
-                if item_col is not None and order_qty_col is not None:
-                    break
+            # Search for the header row with the configured aliases
+            header = self.order_headers.find_header(order_df)
             
-            if item_col is None or order_qty_col is None:
+            if header is None:
                 print("Warning: Could not find required columns in order file")
-                return False
+                return None
+            
+            header_row, column_positions = header
+            item_col = column_positions[ORDER_ITEM_COLUMN]
+            order_qty_col = column_positions[ORDER_QUANTITY_COLUMN]
             
             print(f"Using Item column at index {item_col}, Order Quantity at index {order_qty_col}")
             
@@ -123,80 +621,73 @@ class ExcelProcessorWeb:
                         print(f"Warning: Invalid quantity value '{qty_value}' for item '{item_str}'")
                         continue
             
-            self.order_quantity_lookup = item_quantities
             print(f"Successfully processed {processed_rows} rows from order file")
-            print(f"Created order quantity lookup with {len(self.order_quantity_lookup)} unique items")
+            print(f"Created order quantity lookup with {len(item_quantities)} unique items")
             
-            return True
+            return item_quantities
             
         except Exception as e:
             print(f"Error processing order file: {str(e)}")
-            return False
+            return None
     
-    def _process_summary_sheet(self, file_path: str):
+    def _process_summary_sheet(self, workbook: pd.ExcelFile):
         """Process Summary sheet and create lookup dictionary"""
         try:
-            summary_df = pd.read_excel(file_path, sheet_name='Summary', header=None)
-            
-            # Find Issue Key and Summary columns
-            issue_key_row = None
-            issue_key_col = None
+            summary_df = read_used_range(workbook, 'Summary')
             
-            # Search for "Issue Key" in the sheet
-            for row_idx in range(len(summary_df)):
-                for col_idx in range(len(summary_df.columns)):
-                    if pd.notna(summary_df.iloc[row_idx, col_idx]) and \
-                       str(summary_df.iloc[row_idx, col_idx]).strip() == "Issue key":
-                        issue_key_row = row_idx
-                        issue_key_col = col_idx
-                        break
-                if issue_key_row is not None:
-                    break
+            # Locate the "Issue key" header within the leading rows in one pass
+            header_window = summary_df.iloc[:SUMMARY_HEADER_SEARCH_ROWS]
+            header_window = header_window.apply(lambda col: col.astype(str).str.strip())
+            issue_key_hits = np.argwhere((header_window == "Issue key").to_numpy())
             
-            if issue_key_row is None:
+            if len(issue_key_hits) == 0:
                 print("Warning: 'Issue key' column not found in Summary sheet")
                 return
             
-            # Find Summary column
-            summary_col = None
-            header_row = summary_df.iloc[issue_key_row]
-            for col_idx in range(len(header_row)):
-                if pd.notna(header_row.iloc[col_idx]) and \
-                   str(header_row.iloc[col_idx]).strip() == "Summary":
-                    summary_col = col_idx
-                    break
+            issue_key_row, issue_key_col = (int(pos) for pos in issue_key_hits[0])
             
-            if summary_col is None:
+            # Find Summary column on the same header row
+            summary_hits = np.flatnonzero((header_window.iloc[issue_key_row] == "Summary").to_numpy())
+            
+            if len(summary_hits) == 0:
                 print("Warning: 'Summary' column not found in Summary sheet")
                 return
             
-            # Create lookup dictionary
-            for row_idx in range(issue_key_row + 1, len(summary_df)):
-                issue_key = summary_df.iloc[row_idx, issue_key_col]
-                summary_value = summary_df.iloc[row_idx, summary_col]
-                
-                if pd.notna(issue_key) and pd.notna(summary_value):
-                    self.summary_lookup[str(issue_key).strip()] = str(summary_value).strip()
+            summary_col = int(summary_hits[0])
+            
+            # Create lookup dictionary from the two column slices
+            issue_keys = summary_df.iloc[issue_key_row + 1:, issue_key_col]
+            summary_values = summary_df.iloc[issue_key_row + 1:, summary_col]
+            valid = issue_keys.notna() & summary_values.notna()
+            
+            self.summary_lookup.update(zip(
+                issue_keys[valid].astype(str).str.strip(),
+                summary_values[valid].astype(str).str.strip()
+            ))
             
             print(f"Created summary lookup dictionary with {len(self.summary_lookup)} entries")
                     
         except Exception as e:
             print(f"Error processing Summary sheet: {str(e)}")
     
-    def _process_other_sheets(self, file_path: str, workbook) -> List[pd.DataFrame]:
-        """Process all sheets except Summary sheet"""
-        processed_sheets = []
-        required_columns = ["Planner", "Published", "Item Number", "Item Description", "Oracle On Hand"]
+    def _iter_other_sheets(self, workbook: pd.ExcelFile,
+                           sheet_filter: Optional[SheetFilter] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """Yield (sheet name, processed DataFrame) for each sheet except Summary"""
+        required_columns = self.sheet_headers.columns
         
         for sheet_name in workbook.sheet_names:
             if sheet_name == 'Summary':
                 continue
+            
+            if sheet_filter is not None and not sheet_filter.matches_sheet_name(sheet_name):
+                continue
                 
             try:
                 print(f"Processing sheet: {sheet_name}")
                 
-                # Read sheet without header to handle custom positioning
-                df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
+                # Probe the leading rows only; the full table is read once the header is known
+                probe_rows = max(self.sheet_headers.search_rows, 2)
+                df = read_used_range(workbook, sheet_name, nrows=probe_rows)
                 
                 # Get values from B1 and B2 (0-indexed: B1 = [0,1], B2 = [1,1])
                 model_value = ""
@@ -220,106 +711,89 @@ class ExcelProcessorWeb:
                             model_value = self.summary_lookup[a1_str]
                             print(f"Found {a1_str} in lookup, setting Model to: {model_value}")
                 
+                if sheet_filter is not None and not sheet_filter.matches_cells(model_value, b2c_date_value):
+                    print(f"Skipping sheet {sheet_name}: Model/B2C Date outside filters")
+                    continue
+                
                 # Find table boundaries
-                table_start_row = self._find_table_start(df, required_columns)
+                header = self.sheet_headers.find_header(df)
                 
-                if table_start_row is None:
+                if header is None and len(df) >= probe_rows:
+                    # The table may start below the probed rows; scan the rest of the sheet
+                    print(f"Table header not in the first {probe_rows} rows of {sheet_name}, scanning the whole sheet")
+                    header = self.sheet_headers.find_header(read_used_range(workbook, sheet_name), search_all=True)
+                
+                if header is None:
                     print(f"Warning: Required table not found in sheet {sheet_name}")
                     continue
                 
+                # Read only the required columns below the header row
+                table_start_row, column_positions = header
+                table_df = self._read_table(workbook, sheet_name, table_start_row, column_positions)
+                
                 # Process table data
-                processed_data = self._extract_table_data(
-                    df, table_start_row, required_columns, model_value, b2c_date_value
+                sheet_df = self._extract_table_data(
+                    table_df, required_columns, model_value, b2c_date_value
                 )
                 
-                if processed_data:
-                    new_columns = ["Model", "B2C Date"] + required_columns + ["Ordered Qty"]
-                    sheet_df = pd.DataFrame(processed_data, columns=new_columns)
+                if not sheet_df.empty:
                     sheet_df['Source_Sheet'] = sheet_name
-                    processed_sheets.append(sheet_df)
-                    print(f"Processed {len(processed_data)} rows from {sheet_name}")
+                    print(f"Processed {len(sheet_df)} rows from {sheet_name}")
+                    yield sheet_name, sheet_df
                     
             except Exception as e:
                 print(f"Error processing sheet {sheet_name}: {str(e)}")
-        
-        return processed_sheets
-    
-    def _find_table_start(self, df, required_columns):
-        """Find the start of the data table"""
-        for row_idx in range(len(df)):
-            row_data = df.iloc[row_idx]
-            found_columns = 0
-            for col in required_columns:
-                if any(str(cell).strip() == col for cell in row_data if pd.notna(cell)):
-                    found_columns += 1
-            
-            if found_columns >= 2:  # Found at least 2 required columns
-                return row_idx
-        
-        return None
     
-    def _extract_table_data(self, df, table_start_row, required_columns, model_value, b2c_date_value):
+    def _read_table(self, workbook, sheet_name, table_start_row, column_positions) -> pd.DataFrame:
+        """Read the located columns below the header row, named after the columns they hold"""
+        positions = sorted(column_positions.values())
+        table_df = read_used_range(
+            workbook,
+            sheet_name,
+            skiprows=table_start_row + 1,
+            usecols=positions,
+            dtype=object
+        )
+        names_by_position = {col_idx: col_name for col_name, col_idx in column_positions.items()}
+        return table_df.reindex(columns=positions).rename(columns=names_by_position)
+    
+    def _extract_table_data(self, table_df, required_columns, model_value, b2c_date_value) -> pd.DataFrame:
         """Extract data from the table"""
-        header_row = df.iloc[table_start_row]
+        new_columns = ["Model", "B2C Date"] + required_columns + ["Ordered Qty"]
+        present_columns = [col_name for col_name in required_columns if col_name in table_df.columns]
+        if not present_columns:
+            return pd.DataFrame(columns=new_columns)
         
-        # Find column positions for required columns
-        column_positions = {}
-        for col_idx, cell_value in enumerate(header_row):
-            if pd.notna(cell_value):
-                cell_str = str(cell_value).strip()
-                if cell_str in required_columns:
-                    column_positions[cell_str] = col_idx
+        # Only keep rows with some data
+        rows = table_df.loc[table_df[present_columns].notna().any(axis=1)]
         
-        # Extract data
-        processed_data = []
+        data = {"Model": [model_value] * len(rows), "B2C Date": [b2c_date_value] * len(rows)}
+        for col_name in required_columns:
+            data[col_name] = rows[col_name].tolist() if col_name in present_columns else [""] * len(rows)
         
-        # Process data rows (starting from the row after header)
-        for row_idx in range(table_start_row + 1, len(df)):
-            row_data = {}
-            
-            # Add Model and B2C Date
-            row_data["Model"] = model_value
-            row_data["B2C Date"] = b2c_date_value
-            
-            # Add required columns data
-            has_data = False
-            item_number = None
-            
-            for col_name in required_columns:
-                if col_name in column_positions:
-                    col_idx = column_positions[col_name]
-                    if col_idx < len(df.columns):
-                        cell_value = df.iloc[row_idx, col_idx]
-                        row_data[col_name] = cell_value
-                        if pd.notna(cell_value):
-                            has_data = True
-                            # Store item number for quantity lookup
-                            if col_name == "Item Number":
-                                item_number = str(cell_value).strip()
-                    else:
-                        row_data[col_name] = ""
-                else:
-                    row_data[col_name] = ""
-            
-            # Add Ordered Qty using vlookup
-            ordered_qty = ""
-            if item_number:
-                # Try exact match first
-                if item_number in self.order_quantity_lookup:
-                    ordered_qty = self.order_quantity_lookup[item_number]
+        # Add Ordered Qty using vlookup
+        ordered_qty = [""] * len(rows)
+        if "Item Number" in present_columns:
+            lookup = self.order_quantity_lookup
+            folded_lookup = self._folded_order_lookup()
+            for row_idx, cell_value in enumerate(data["Item Number"]):
+                if pd.isna(cell_value):
+                    continue
+                item_number = str(cell_value).strip()
+                if not item_number:
+                    continue
+                if item_number in lookup:
+                    ordered_qty[row_idx] = lookup[item_number]
                 else:
-                    # Try to find partial matches or different formats
-                    item_number_clean = item_number.strip().upper()
-                    for lookup_item, lookup_qty in self.order_quantity_lookup.items():
-                        lookup_item_clean = lookup_item.strip().upper()
-                        if item_number_clean == lookup_item_clean:
-                            ordered_qty = lookup_qty
-                            break
-            
-            row_data["Ordered Qty"] = ordered_qty
-            
-            # Only add row if it has some data
-            if has_data:
-                processed_data.append(row_data)
+                    ordered_qty[row_idx] = folded_lookup.get(item_number.upper(), "")
+        data["Ordered Qty"] = ordered_qty
         
-        return processed_data
+        return pd.DataFrame(data, columns=new_columns)
+    
+    def _folded_order_lookup(self) -> Dict[str, float]:
+        """Case-folded order lookup, shared by the order cache or built once per lookup"""
+        cached = self._folded_lookup_cache
+        if cached is None or cached[0] is not self.order_quantity_lookup:
+            cached = (self.order_quantity_lookup, fold_order_lookup(self.order_quantity_lookup))
+            self._folded_lookup_cache = cached
+        return cached[1]
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional, Tuple
+
+# Canonical order file columns the engine reads
+ORDER_ITEM_COLUMN = 'Item'
+ORDER_QUANTITY_COLUMN = 'Order Quantity'
+
+# Columns of the combined result read from each data sheet
+SHEET_COLUMNS = ["Planner", "Published", "Item Number", "Item Description", "Oracle On Hand"]
+
+# Canonical column names of each header config section. They are fixed
+# because the engine and its reports use them; a config only changes the
+# header texts accepted for them.
+CANONICAL_COLUMNS = {
+    'order': [ORDER_ITEM_COLUMN, ORDER_QUANTITY_COLUMN],
+    'sheet': SHEET_COLUMNS,
+}
+
+# Default header layouts. Each section maps a canonical column name to the
+# header texts accepted for it; "required" columns must all be present on
+# the header row and at least "min_columns" columns must be found overall.
+DEFAULT_HEADER_CONFIG = {
+    'order': {
+        'case_sensitive': False,
+        'collapse_whitespace': True,
+        'separators': '_-',
+        'search_rows': 15,
+        'min_columns': 2,
+        'columns': {
+            'Item': {
+                'aliases': ["item", "item number", "item_number", "itemNumber",
+                            "part", "part number", "part_number", "partNumber"],
+                'required': True,
+            },
+            'Order Quantity': {
+                'aliases': ["order quantity", "order qty", "ordered quantity", "quantity",
+                            "qty", "order_quantity", "ordered_qty"],
+                'required': True,
+            },
+        },
+    },
+    'sheet': {
+        'case_sensitive': True,
+        'collapse_whitespace': False,
+        'separators': '',
+        'search_rows': 50,
+        'min_columns': 2,
+        'columns': {
+            'Planner': {'aliases': ["Planner"], 'required': False},
+            'Published': {'aliases': ["Published"], 'required': False},
+            'Item Number': {'aliases': ["Item Number"], 'required': False},
+            'Item Description': {'aliases': ["Item Description"], 'required': False},
+            'Oracle On Hand': {'aliases': ["Oracle On Hand"], 'required': False},
+        },
+    },
+}
+
+def load_header_config(path: str) -> Dict[str, Any]:
+    """Read a header config JSON file, filling missing sections from the defaults"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    # Fail on unknown column names now rather than in every job
+    return merge_header_config(config)
+
+def merge_header_config(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Complete a partial header config key by key from DEFAULT_HEADER_CONFIG"""
+    config = config or {}
+    merged = {}
+    for section, default in DEFAULT_HEADER_CONFIG.items():
+        section_config = config.get(section) or {}
+        columns = section_config.get('columns') or {}
+        unknown = [name for name in columns if name not in CANONICAL_COLUMNS[section]]
+        if unknown:
+            raise ValueError(
+                f"Unknown {section} column(s) {', '.join(unknown)} in header config - "
+                f"add them as aliases of: {', '.join(CANONICAL_COLUMNS[section])}"
+            )
+
+        merged_columns = {name: {**spec, **columns.get(name, {})} for name, spec in default['columns'].items()}
+        if section == 'order':
+            # The lookup cannot be built without both order columns
+            for name in (ORDER_ITEM_COLUMN, ORDER_QUANTITY_COLUMN):
+                merged_columns[name]['required'] = True
+        merged[section] = {**default, **section_config, 'columns': merged_columns}
+    return merged
+
+class HeaderMatcher:
+    """Header row detector compiled once from one section of a header config"""
+
+    def __init__(self, columns: Dict[str, Dict[str, Any]], case_sensitive: bool = False,
+                 collapse_whitespace: bool = True, separators: str = '', search_rows: int = 15,
+                 min_columns: int = 1):
+        self.columns = list(columns)
+        self.required = [name for name, spec in columns.items() if spec.get('required', False)]
+        self.case_sensitive = case_sensitive
+        self.collapse_whitespace = collapse_whitespace
+        self.separators = separators
+        self.search_rows = search_rows
+        self.min_columns = max(min_columns, len(self.required), 1)
+
+        # Characters treated like spaces (e.g. "item_number" == "item number")
+        self._separator_pattern = re.compile(f"[{re.escape(separators)}]") if separators else None
+
+        self.aliases = {}
+        for name, spec in columns.items():
+            for alias in [name] + list(spec.get('aliases', [])):
+                self.aliases.setdefault(self._normalize_text(alias), name)
+
+        # Identifies the compiled rules, e.g. to key caches of parsed files
+        self.fingerprint = hashlib.blake2b(json.dumps(
+            [sorted(self.aliases.items()), self.required, self.min_columns, self.search_rows,
+             self.case_sensitive, self.collapse_whitespace, self.separators]
+        ).encode('utf-8'), digest_size=8).hexdigest()
+
+    @classmethod
+    def from_config(cls, section: Dict[str, Any]) -> 'HeaderMatcher':
+        return cls(
+            section['columns'],
+            case_sensitive=section.get('case_sensitive', False),
+            collapse_whitespace=section.get('collapse_whitespace', True),
+            separators=section.get('separators', ''),
+            search_rows=section.get('search_rows', 15),
+            min_columns=section.get('min_columns', 1)
+        )
+
+    def _normalize_text(self, text: str) -> str:
+        text = str(text)
+        if self._separator_pattern is not None:
+            text = self._separator_pattern.sub(' ', text)
+        if self.collapse_whitespace:
+            text = ' '.join(text.split())
+        text = text.strip()
+        return text if self.case_sensitive else text.lower()
+
+    def _normalize_cells(self, cells: pd.Series) -> pd.Series:
+        text = cells.astype(str)
+        if self._separator_pattern is not None:
+            text = text.str.replace(self._separator_pattern, ' ', regex=True)
+        if self.collapse_whitespace:
+            text = text.str.replace(r'\s+', ' ', regex=True)
+        text = text.str.strip()
+        return text if self.case_sensitive else text.str.lower()
+
+    def match_cells(self, block: pd.DataFrame) -> np.ndarray:
+        """Return an array shaped like block holding the matched column name or None"""
+        cells = pd.Series(block.to_numpy(dtype=object).ravel())
+        present = cells.notna()
+
+        matched = pd.Series(None, index=cells.index, dtype=object)
+        matched[present] = self._normalize_cells(cells[present]).map(self.aliases)
+        return matched.where(matched.notna(), None).to_numpy(dtype=object).reshape(block.shape)
+
+    def find_header(self, df: pd.DataFrame, search_all: bool = False) -> Optional[Tuple[int, Dict[str, int]]]:
+        """Return (row, {column: index}) of the first header row within search_rows (all rows with search_all)"""
+        block = df if search_all else df.iloc[:self.search_rows]
+        if block.empty:
+            return None
+
+        matched = self.match_cells(block)
+        for row_idx in np.flatnonzero(pd.notna(matched).any(axis=1)):
+            row_idx = int(row_idx)
+            positions = {}
+            for col_idx in np.flatnonzero(pd.notna(matched[row_idx])):
+                positions[matched[row_idx, col_idx]] = int(col_idx)
+
+            if len(positions) >= self.min_columns and all(name in positions for name in self.required):
+                return row_idx, positions
+
+        return None
+
+def build_header_matchers(config: Optional[Dict[str, Any]] = None) -> Dict[str, HeaderMatcher]:
+    """Compile every section of a header config, completed from the defaults"""
+    config = merge_header_config(config)
+    return {section: HeaderMatcher.from_config(section_config) for section, section_config in config.items()}
@@ -0,0 +1,282 @@
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, Any, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from excel_processor_web import ExcelProcessorWeb, OUTPUT_FORMATS, export_results
+from header_mapping import load_header_config
+
+# Largest accepted request body (both workbooks together)
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+# Seconds a queued-full client is asked to wait before retrying
+RETRY_AFTER_SECONDS = 5
+
+def run_job(job_id: str, main_bytes: bytes, order_bytes: bytes, output_format: str,
+            submitted_at: float, header_config: Dict[str, Any] = None) -> Tuple[Dict[str, Any], bytes]:
+    """Process one job in a worker and return (metrics, serialized output)"""
+    started_at = time.time()
+    processor = ExcelProcessorWeb(header_config=header_config)
+    result = processor.process_files(BytesIO(main_bytes), BytesIO(order_bytes))
+    processed_at = time.time()
+
+    metrics = {
+        'job_id': job_id,
+        'success': result['success'],
+        'queue_wait_seconds': round(started_at - submitted_at, 4),
+        'processing_seconds': round(processed_at - started_at, 4),
+    }
+
+    if not result['success']:
+        metrics['error'] = result['error']
+        return metrics, b''
+
+    payload = export_results(result, output_format)
+
+    metrics.update({
+        'serialize_seconds': round(time.time() - processed_at, 4),
+        'total_items': result['total_items'],
+        'matched_items': result['matched_items'],
+        'match_rate': round(result['match_rate'], 2),
+        'output_format': output_format,
+        'output_bytes': len(payload),
+    })
+    return metrics, payload
+
+class ProcessingService:
+    """Pool running up to workers jobs with queue_size more waiting; further submissions are rejected"""
+
+    def __init__(self, workers: int = 2, queue_size: int = 8, job_timeout: float = 600,
+                 header_config: Dict[str, Any] = None):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.job_timeout = job_timeout
+        self.header_config = header_config
+        self.executor = self._new_executor()
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.pool_restarts = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Workers are spawned, not forked, since the server's handler threads may hold locks
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _replace_broken_executor(self, executor: ProcessPoolExecutor):
+        """Swap in a fresh pool after a worker died (e.g. killed for using too much memory)"""
+        with self._lock:
+            if self.executor is executor:
+                self.executor = self._new_executor()
+                self.pool_restarts += 1
+
+    def submit(self, main_bytes: bytes, order_bytes: bytes, output_format: str):
+        """Queue a job, returning its future, or None if the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+
+        with self._lock:
+            self.in_flight += 1
+
+        job_id = uuid.uuid4().hex
+        job = (run_job, job_id, main_bytes, order_bytes, output_format, time.time(), self.header_config)
+        executor = self.executor
+        try:
+            try:
+                future = executor.submit(*job)
+            except BrokenProcessPool:
+                self._replace_broken_executor(executor)
+                executor = self.executor
+                future = executor.submit(*job)
+        except Exception:
+            self._release()
+            raise
+
+        future.add_done_callback(lambda done: self._job_done(done, executor))
+        return future
+
+    def _job_done(self, future, executor: ProcessPoolExecutor):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace_broken_executor(executor)
+        self._release(completed=True)
+
+    def _release(self, completed: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if completed:
+                self.completed += 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return current pool utilisation"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'pool_restarts': self.pool_restarts,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, bytes]:
+    """Return the fields of a multipart/form-data body keyed by field name"""
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+    )
+
+    fields = {}
+    if not message.is_multipart():
+        return fields
+
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        if name:
+            fields[name] = part.get_payload(decode=True) or b''
+    return fields
+
+class ProcessingRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end: POST /process (main_file, order_file, optional format) and GET /health"""
+
+    service: ProcessingService = None
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/health':
+            self._send_json(200, self.service.stats())
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/process':
+            self._send_json(404, {'error': 'Not found'})
+            return
+
+        content_type = self.headers.get('Content-Type', '')
+        if not content_type.startswith('multipart/form-data'):
+            self._send_json(400, {'error': 'Expected a multipart/form-data upload'})
+            return
+
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = 0
+        if content_length <= 0:
+            self._send_json(411, {'error': 'Content-Length is required'})
+            return
+        if content_length > MAX_UPLOAD_BYTES:
+            self._send_json(413, {'error': f'Upload exceeds {MAX_UPLOAD_BYTES:,} bytes'})
+            return
+
+        fields = parse_multipart(content_type, self.rfile.read(content_length))
+
+        if 'main_file' not in fields or 'order_file' not in fields:
+            self._send_json(400, {'error': 'Both main_file and order_file uploads are required'})
+            return
+
+        query = parse_qs(url.query)
+        output_format = query.get('format', [None])[0] or fields.get('format', b'xlsx').decode('utf-8', 'replace')
+        output_format = output_format.strip().lower()
+        if output_format not in OUTPUT_FORMATS:
+            self._send_json(400, {'error': f"Unsupported format '{output_format}' - use one of {', '.join(OUTPUT_FORMATS)}"})
+            return
+
+        try:
+            future = self.service.submit(fields['main_file'], fields['order_file'], output_format)
+        except Exception as e:
+            self._send_json(503, {'error': f'Worker pool unavailable: {str(e)}'},
+                            {'Retry-After': str(RETRY_AFTER_SECONDS)})
+            return
+        if future is None:
+            self._send_json(503, {'error': 'Server busy - job queue is full'},
+                            {'Retry-After': str(RETRY_AFTER_SECONDS)})
+            return
+
+        try:
+            metrics, payload = future.result(timeout=self.service.job_timeout)
+        except FutureTimeoutError:
+            self._send_json(504, {'error': 'Processing timed out'})
+            return
+        except BrokenProcessPool:
+            self._send_json(500, {'error': 'Worker process died while processing - the pool has been restarted'})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': f'Processing error: {str(e)}'})
+            return
+
+        if not metrics['success']:
+            self._send_json(422, metrics)
+            return
+
+        extension, mime_type = OUTPUT_FORMATS[output_format]
+        self.send_response(200)
+        self.send_header('Content-Type', mime_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Content-Disposition', f'attachment; filename="processed{extension}"')
+        self.send_header('X-Job-Id', metrics['job_id'])
+        self.send_header('X-Job-Metrics', json.dumps(metrics))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status: int, data: Dict[str, Any], headers: Dict[str, str] = None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+def create_server(host: str = '127.0.0.1', port: int = 8081, workers: int = 2, queue_size: int = 8,
+                  job_timeout: float = 600, header_config: Dict[str, Any] = None) -> ThreadingHTTPServer:
+    """Create an HTTP server bound to host:port with its own worker pool"""
+    service = ProcessingService(workers=workers, queue_size=queue_size, job_timeout=job_timeout,
+                                header_config=header_config)
+    handler = type('BoundProcessingRequestHandler', (ProcessingRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.service = service
+    return server
+
+def main():
+    """Run the processing service from the command line"""
+    parser = argparse.ArgumentParser(description="HTTP service for Excel processing")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to bind (default: localhost only)")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--workers', type=int, default=2, help="Jobs processed in parallel")
+    parser.add_argument('--queue-size', type=int, default=8, help="Jobs allowed to wait for a worker")
+    parser.add_argument('--job-timeout', type=float, default=600, help="Seconds before a job is abandoned")
+    parser.add_argument('--header-config', help="JSON file with header aliases (see header_mapping.py)")
+    args = parser.parse_args()
+
+    header_config = load_header_config(args.header_config) if args.header_config else None
+    server = create_server(args.host, args.port, args.workers, args.queue_size, args.job_timeout, header_config)
+    print(f"Excel processing service listening on http://{args.host}:{args.port}")
+    print(f"Workers: {args.workers}, queue size: {args.queue_size}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        server.service.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import BytesIO
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+from openpyxl import Workbook
+
+from excel_processor_web import ExcelProcessorWeb
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def generate_workbooks(sheets: int = 20, rows_per_sheet: int = 500, order_items: int = 2000,
+                       seed: int = 0) -> Tuple[bytes, bytes]:
+    """Build a main workbook and an order file shaped like real exports, about half the items ordered"""
+    rng = random.Random(seed)
+    item_pool = max(order_items * 2, 1)
+
+    main_wb = Workbook(write_only=True)
+    summary = main_wb.create_sheet('Summary')
+    summary.append(["Jira export"])
+    summary.append([])
+    summary.append(["Issue key", "Summary", "Status"])
+    for sheet_idx in range(sheets):
+        summary.append([f"NPI-{sheet_idx}", f"Model {sheet_idx % 10}", "Open"])
+
+    for sheet_idx in range(sheets):
+        sheet = main_wb.create_sheet(f"NPI-{sheet_idx}")
+        sheet.append([f"NPI-{sheet_idx}", ""])
+        sheet.append(["B2C Date", f"2024-{sheet_idx % 12 + 1:02d}-15"])
+        sheet.append([])
+        sheet.append(["Planner", "Published", "Item Number", "Item Description", "Oracle On Hand", "Notes"])
+        for row_idx in range(rows_per_sheet):
+            item = rng.randrange(item_pool)
+            sheet.append([f"Planner {item % 7}", "Y", f"PN{item:07d}", f"Part {item}", rng.randrange(500), ""])
+
+    order_wb = Workbook(write_only=True)
+    orders = order_wb.create_sheet('Orders')
+    orders.append(["Open orders"])
+    orders.append(["Item", "Order Quantity"])
+    for item in rng.sample(range(item_pool), min(order_items, item_pool)):
+        orders.append([f"PN{item:07d}", rng.randrange(1, 1000)])
+
+    main_buffer, order_buffer = BytesIO(), BytesIO()
+    main_wb.save(main_buffer)
+    order_wb.save(order_buffer)
+    return main_buffer.getvalue(), order_buffer.getvalue()
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process, or 0 if it cannot be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_bytes()
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _silence_output():
+    sys.stdout = open(os.devnull, 'w')
+
+def _warm_up() -> int:
+    """No-op job that makes a worker start (and import pandas) before timing begins"""
+    return os.getpid()
+
+def run_job(main_bytes: bytes, order_bytes: bytes) -> Tuple[float, bool, int, int]:
+    """Process one workbook pair and return (latency seconds, success, worker pid, worker peak RSS)"""
+    started_at = time.perf_counter()
+    result = ExcelProcessorWeb().process_files(BytesIO(main_bytes), BytesIO(order_bytes))
+    return time.perf_counter() - started_at, result['success'], os.getpid(), peak_rss_bytes()
+
+class RssSampler:
+    """Background thread recording the highest RSS seen while it runs"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+def run_level(mode: str, concurrency: int, jobs: int, main_bytes: bytes, order_bytes: bytes) -> Dict[str, Any]:
+    """Run jobs calls with the given concurrency and summarize the results"""
+    if mode == 'threads':
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+    else:
+        # Fresh workers per level so their peak RSS reflects this level only
+        executor = ProcessPoolExecutor(max_workers=concurrency, initializer=_silence_output,
+                                       mp_context=multiprocessing.get_context('spawn'))
+
+    with executor, RssSampler() as sampler:
+        if mode != 'threads':
+            # Workers start on demand; one no-op each keeps spawn and import time out of the timings
+            for future in [executor.submit(_warm_up) for _ in range(concurrency)]:
+                future.result()
+
+        started_at = time.perf_counter()
+        futures = [executor.submit(run_job, main_bytes, order_bytes) for _ in range(jobs)]
+        outcomes = [future.result() for future in futures]
+        wall_seconds = time.perf_counter() - started_at
+
+    latencies = np.array([latency for latency, _, _, _ in outcomes])
+    failures = sum(1 for _, success, _, _ in outcomes if not success)
+    if mode == 'threads':
+        peak_rss = sampler.peak
+    else:
+        # Parent plus each worker's peak; ru_maxrss only grows, so a worker's last job reports its peak
+        worker_peaks = {}
+        for _, _, pid, rss in outcomes:
+            worker_peaks[pid] = max(worker_peaks.get(pid, 0), rss)
+        peak_rss = sampler.peak + sum(worker_peaks.values())
+
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'jobs': jobs,
+        'failures': failures,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_jobs_per_second': round(jobs / wall_seconds, 3),
+        'p50_seconds': round(float(np.percentile(latencies, 50)), 3),
+        'p95_seconds': round(float(np.percentile(latencies, 95)), 3),
+        'p99_seconds': round(float(np.percentile(latencies, 99)), 3),
+        'peak_rss_mb': round(peak_rss / (1024 * 1024), 1),
+    }
+
+def print_report(results: List[Dict[str, Any]]):
+    header = f"{'mode':<10}{'conc':>6}{'jobs':>6}{'fail':>6}{'jobs/s':>10}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'peak RSS MB':>13}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(f"{row['mode']:<10}{row['concurrency']:>6}{row['jobs']:>6}{row['failures']:>6}"
+              f"{row['throughput_jobs_per_second']:>10.2f}{row['p50_seconds']:>9.3f}"
+              f"{row['p95_seconds']:>9.3f}{row['p99_seconds']:>9.3f}{row['peak_rss_mb']:>13.1f}")
+
+def main():
+    """Run the load test from the command line"""
+    parser = argparse.ArgumentParser(description="Concurrency load test for ExcelProcessorWeb.process_files")
+    parser.add_argument('--sheets', type=int, default=20, help="Data sheets in the generated main workbook")
+    parser.add_argument('--rows', type=int, default=500, help="Table rows per data sheet")
+    parser.add_argument('--order-items', type=int, default=2000, help="Rows in the generated order file")
+    parser.add_argument('--concurrency', default='1,2,4,8', help="Comma-separated concurrency levels")
+    parser.add_argument('--jobs-per-worker', type=int, default=3, help="Jobs per concurrent worker at each level")
+    parser.add_argument('--mode', choices=['threads', 'processes', 'both'], default='both')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path', help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    modes = ['threads', 'processes'] if args.mode == 'both' else [args.mode]
+
+    print(f"Generating workbooks: {args.sheets} sheets x {args.rows} rows, {args.order_items} order items...")
+    main_bytes, order_bytes = generate_workbooks(args.sheets, args.rows, args.order_items, args.seed)
+    print(f"Main workbook: {len(main_bytes):,} bytes, order file: {len(order_bytes):,} bytes")
+
+    results = []
+    for mode in modes:
+        for concurrency in levels:
+            jobs = concurrency * args.jobs_per_worker
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                result = run_level(mode, concurrency, jobs, main_bytes, order_bytes)
+            results.append(result)
+            print(f"{mode} x{concurrency}: {result['throughput_jobs_per_second']:.2f} jobs/s, "
+                  f"p95 {result['p95_seconds']:.3f}s, peak RSS {result['peak_rss_mb']:.1f} MB")
+
+    print()
+    print_report(results)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'parameters': vars(args), 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+if __name__ == "__main__":
+    main()
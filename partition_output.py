@@ -0,0 +1,132 @@
+import json
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+from excel_processor_web import OUTPUT_FORMATS, write_frame
+
+# Columns the combined result can be partitioned by
+PARTITION_KEYS = ["Model", "Planner", "Source_Sheet"]
+
+# Name of the manifest written next to the partition files
+MANIFEST_NAME = 'manifest.json'
+
+# Results smaller than this (per format) are written in-process by default:
+# spawning workers and importing pandas in each costs more than it saves
+PARALLEL_MIN_ROWS = {'xlsx': 20_000, 'csv': 1_000_000, 'parquet': 1_000_000}
+
+def _safe_filename(value: str) -> str:
+    """Turn a partition value into a portable file name stem"""
+    name = re.sub(r'[^\w\-. ]+', '_', value).strip(' .')
+    return name[:100] or '(blank)'
+
+def split_partitions(combined_df: pd.DataFrame, key: str) -> List[Tuple[str, pd.DataFrame]]:
+    """Split the combined result into (value, rows) pairs, largest partition first"""
+    if key not in PARTITION_KEYS:
+        raise ValueError(f"Unsupported partition key: {key}")
+
+    values = combined_df[key].where(combined_df[key].notna(), "").astype(str).str.strip()
+    groups = combined_df.groupby(values, sort=True).indices
+    partitions = [(value, combined_df.iloc[rows]) for value, rows in groups.items()]
+
+    # Starting the biggest partitions first keeps wall time close to the largest one
+    partitions.sort(key=lambda partition: len(partition[1]), reverse=True)
+    return partitions
+
+def _export_partition(partition_df: pd.DataFrame, output_format: str,
+                      path: Optional[str] = None) -> Tuple[Optional[bytes], int, float]:
+    """Write one partition to path (or memory); return (bytes if in memory, size, seconds)"""
+    started_at = time.perf_counter()
+    if path is not None:
+        write_frame(partition_df, path, output_format)
+        return None, os.path.getsize(path), time.perf_counter() - started_at
+
+    buffer = BytesIO()
+    write_frame(partition_df, buffer, output_format)
+    data = buffer.getvalue()
+    return data, len(data), time.perf_counter() - started_at
+
+def export_partitions(combined_df: pd.DataFrame, key: str, output_format: str = 'xlsx',
+                      output_dir: Optional[str] = None, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Write each partition to its own file in parallel (to output_dir with a manifest, else into data)"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    started_at = time.perf_counter()
+    partitions = split_partitions(combined_df, key)
+    extension = OUTPUT_FORMATS[output_format][0]
+
+    # Unique file names even when different values sanitize to the same stem
+    file_names = []
+    used_names = set()
+    for value, _ in partitions:
+        stem = _safe_filename(value)
+        name, suffix = f"{stem}{extension}", 2
+        while name.lower() in used_names:
+            name, suffix = f"{stem}_{suffix}{extension}", suffix + 1
+        used_names.add(name.lower())
+        file_names.append(name)
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(output_dir, name) if output_dir is not None else None for name in file_names]
+
+    if workers is None and len(combined_df) < PARALLEL_MIN_ROWS[output_format]:
+        workers = 1
+    workers = min(workers or os.cpu_count() or 1, max(len(partitions), 1))
+    if workers == 1:
+        outcomes = [_export_partition(df, output_format, path) for (_, df), path in zip(partitions, paths)]
+    else:
+        # Spawned workers: forking a threaded caller (Streamlit, the HTTP service) can deadlock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_export_partition, df, output_format, path)
+                       for (_, df), path in zip(partitions, paths)]
+            outcomes = [future.result() for future in futures]
+
+    manifest = {
+        'partition_key': key,
+        'output_format': output_format,
+        'total_rows': len(combined_df),
+        'workers': workers,
+        'wall_seconds': round(time.perf_counter() - started_at, 3),
+        'partitions': [
+            {
+                'value': value,
+                'file': name,
+                'rows': len(df),
+                'bytes': size,
+                'write_seconds': round(seconds, 3),
+            }
+            for (value, df), name, (_, size, seconds) in zip(partitions, file_names, outcomes)
+        ],
+    }
+
+    if output_dir is not None:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    else:
+        manifest['data'] = {name: data for name, (data, _, _) in zip(file_names, outcomes)}
+
+    return manifest
+
+def export_partitions_zip(combined_df: pd.DataFrame, key: str, output_format: str = 'xlsx',
+                          workers: Optional[int] = None) -> bytes:
+    """Export partitions in memory and bundle them with the manifest in a zip archive"""
+    manifest = export_partitions(combined_df, key, output_format, workers=workers)
+    files = manifest.pop('data')
+
+    buffer = BytesIO()
+    # xlsx and parquet are already compressed; only deflate CSV
+    compression = zipfile.ZIP_DEFLATED if output_format == 'csv' else zipfile.ZIP_STORED
+    with zipfile.ZipFile(buffer, 'w', compression=compression) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    return buffer.getvalue()
@@ -0,0 +1,94 @@
+import re
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+
+# Columns of the combined result that can be searched
+SEARCH_FIELDS = ["Item Number", "Model", "Planner", "Source_Sheet"]
+
+# Separator used when joining distinct values for substring search
+_VALUE_SEPARATOR = '\x00'
+
+class _FieldIndex:
+    """Sorted distinct values of one column plus the rows holding each value"""
+
+    def __init__(self, values: pd.Series):
+        normalized = values.where(values.notna(), "").astype(str).str.strip().str.lower()
+        codes, uniques = pd.factorize(normalized, sort=True)
+
+        self.values = np.asarray(uniques, dtype=object)
+        self.codes = codes
+        # Row numbers grouped by value code; value k owns row_order[starts[k]:starts[k + 1]]
+        self.row_order = np.argsort(codes, kind='stable')
+        self.starts = np.searchsorted(codes[self.row_order], np.arange(len(uniques) + 1))
+
+        # All distinct values in one string so a substring scan is a single regex pass
+        self.joined = _VALUE_SEPARATOR.join(self.values)
+        lengths = np.fromiter((len(value) for value in self.values), dtype=np.int64, count=len(self.values))
+        self.value_offsets = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+
+    def prefix_rows(self, prefix: str) -> np.ndarray:
+        """Rows whose value starts with prefix"""
+        low = np.searchsorted(self.values, prefix, side='left')
+        high = np.searchsorted(self.values, prefix + '\U0010ffff', side='left')
+        return self.row_order[self.starts[low]:self.starts[high]]
+
+    def substring_rows(self, text: str) -> np.ndarray:
+        """Rows whose value contains text"""
+        if _VALUE_SEPARATOR in text:
+            return np.empty(0, dtype=np.intp)
+
+        # Consume the rest of the value so each value yields at most one match
+        pattern = re.escape(text) + '[^' + _VALUE_SEPARATOR + ']*'
+        positions = np.fromiter(
+            (match.start() for match in re.finditer(pattern, self.joined)), dtype=np.int64
+        )
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.intp)
+
+        matched_values = np.zeros(len(self.values), dtype=bool)
+        matched_values[np.searchsorted(self.value_offsets, positions, side='right') - 1] = True
+        return np.flatnonzero(matched_values[self.codes])
+
+class ResultSearchIndex:
+    """Case-insensitive search index over the distinct values of each field of a combined result"""
+
+    def __init__(self, combined_df: pd.DataFrame, fields: Optional[List[str]] = None):
+        self.combined_df = combined_df
+        self.fields = [field for field in (fields or SEARCH_FIELDS) if field in combined_df.columns]
+        self._indexes = {field: _FieldIndex(combined_df[field]) for field in self.fields}
+
+    def search(self, query: str, field: Optional[str] = None, mode: str = 'prefix',
+               page: int = 0, page_size: int = 50) -> Dict[str, Any]:
+        """Return a page (numbered from 0) of rows matching query by prefix or substring, in field or any"""
+        started_at = time.perf_counter()
+        text = query.strip().lower()
+
+        if field is not None and field not in self._indexes:
+            raise ValueError(f"Unsupported search field: {field}")
+        if mode not in ('prefix', 'substring'):
+            raise ValueError(f"Unsupported search mode: {mode}")
+
+        if not text:
+            rows = np.arange(len(self.combined_df))
+        else:
+            fields = [field] if field is not None else self.fields
+            matched = np.zeros(len(self.combined_df), dtype=bool)
+            for name in fields:
+                index = self._indexes[name]
+                matched[index.prefix_rows(text) if mode == 'prefix' else index.substring_rows(text)] = True
+            rows = np.flatnonzero(matched)
+
+        total_matches = len(rows)
+        page_count = max(1, -(-total_matches // page_size))
+        page = min(max(page, 0), page_count - 1)
+        page_rows = rows[page * page_size:(page + 1) * page_size]
+
+        return {
+            'rows': self.combined_df.iloc[page_rows],
+            'total_matches': total_matches,
+            'page': page,
+            'page_count': page_count,
+            'elapsed_ms': (time.perf_counter() - started_at) * 1000,
+        }
@@ -0,0 +1,189 @@
+import argparse
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from excel_processor_web import ExcelSource, open_source, source_name, normalize_item_keys
+
+# Rows of two runs are matched on these columns
+DIFF_KEY_COLUMNS = ["Source_Sheet", "Item Number"]
+
+# Columns compared between matched rows by default
+DIFF_COLUMNS = ["Ordered Qty", "Oracle On Hand"]
+
+# Columns identifying each added, removed or changed item in the report
+DIFF_ITEM_COLUMNS = ["Source_Sheet", "Model", "Planner", "Item Number", "Item Description"]
+
+# Change report sheet names
+DIFF_SUMMARY = 'Diff Summary'
+DIFF_BY_SHEET = 'Changes by Sheet'
+DIFF_ADDED = 'Added Items'
+DIFF_REMOVED = 'Removed Items'
+DIFF_CHANGED = 'Changed Items'
+
+def load_result(source: ExcelSource) -> pd.DataFrame:
+    """Read a processed result: an xlsx output (its Combined sheet), parquet or CSV"""
+    extension = os.path.splitext(source_name(source))[1].lower()
+    if extension not in ('.xlsx', '.xlsm', '.parquet', '.csv'):
+        # Unknown name (e.g. a buffer): tell the formats apart by their magic bytes
+        if hasattr(source, 'read'):
+            magic = open_source(source).read(4)
+        else:
+            with open(source, 'rb') as f:
+                magic = f.read(4)
+        extension = {b'PK\x03\x04': '.xlsx', b'PAR1': '.parquet'}.get(magic, '.csv')
+
+    if extension == '.parquet':
+        return pd.read_parquet(open_source(source))
+    if extension == '.csv':
+        # Keep item numbers as text so "00123" is not read as 123
+        return pd.read_csv(open_source(source), dtype=str)
+
+    with pd.ExcelFile(open_source(source)) as workbook:
+        sheet_name = 'Combined' if 'Combined' in workbook.sheet_names else workbook.sheet_names[0]
+        return pd.read_excel(workbook, sheet_name=sheet_name)
+
+def _normalized_codes(old_values: pd.Series, new_values: pd.Series, normalize) -> tuple:
+    """Integer codes shared by both runs for a key column, normalizing only its distinct values"""
+    codes, uniques = pd.factorize(pd.concat([old_values, new_values], ignore_index=True), use_na_sentinel=False)
+    normalized = normalize(pd.Series(uniques, dtype=object))
+    unique_codes, normalized_uniques = pd.factorize(normalized)
+    blank = np.flatnonzero(normalized_uniques == "")
+    row_codes = unique_codes[codes]
+    if len(blank):
+        row_codes[row_codes == blank[0]] = -1
+    return row_codes[:len(old_values)], row_codes[len(old_values):]
+
+def _row_keys(sheet_codes: np.ndarray, item_codes: np.ndarray, item_count: int) -> pd.DataFrame:
+    """(key, occurrence, row) of rows with an Item Number; occurrence pairs repeated items in order"""
+    rows = np.flatnonzero(item_codes >= 0)
+    # Sheet codes start at -1 for a blank sheet, so shift them to keep keys unique
+    key = (sheet_codes[rows].astype(np.int64) + 1) * item_count + item_codes[rows]
+    keys = pd.DataFrame({'key': key, 'row': rows})
+    keys['occurrence'] = keys.groupby('key', sort=False).cumcount()
+    return keys
+
+def _as_text(values: pd.Series) -> pd.Series:
+    """Values as trimmed text, missing values as blank"""
+    return values.where(values.notna(), "").astype(str).str.strip()
+
+def _values_differ(old: pd.Series, new: pd.Series) -> np.ndarray:
+    """Compare numerically where both sides are numbers, otherwise as trimmed text (blank == missing)"""
+    old_number = pd.to_numeric(old, errors='coerce').to_numpy(dtype=float)
+    new_number = pd.to_numeric(new, errors='coerce').to_numpy(dtype=float)
+    both_numeric = ~np.isnan(old_number) & ~np.isnan(new_number)
+
+    differs = both_numeric & (old_number != new_number)
+    text_rows = ~both_numeric
+    differs[text_rows] = _as_text(old[text_rows]).to_numpy() != _as_text(new[text_rows]).to_numpy()
+    return differs
+
+def diff_results(old_df: pd.DataFrame, new_df: pd.DataFrame,
+                 columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """Added, removed and changed items between two results, matched on Source_Sheet + Item Number"""
+    columns = [col for col in (columns or DIFF_COLUMNS) if col in old_df.columns and col in new_df.columns]
+    for df in (old_df, new_df):
+        missing = [col for col in DIFF_KEY_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Result is missing key columns: {', '.join(missing)}")
+
+    old_sheets, new_sheets = _normalized_codes(old_df['Source_Sheet'], new_df['Source_Sheet'], _as_text)
+    old_items, new_items = _normalized_codes(old_df['Item Number'], new_df['Item Number'], normalize_item_keys)
+    item_count = int(max(old_items.max(initial=0), new_items.max(initial=0))) + 1
+    old_keys = _row_keys(old_sheets, old_items, item_count)
+    new_keys = _row_keys(new_sheets, new_items, item_count)
+
+    joined = old_keys.merge(new_keys, on=['key', 'occurrence'], how='outer', suffixes=('_old', '_new'))
+    matched = joined['row_old'].notna() & joined['row_new'].notna()
+    added_rows = joined.loc[joined['row_old'].isna(), 'row_new'].astype(np.int64).sort_values().to_numpy()
+    removed_rows = joined.loc[joined['row_new'].isna(), 'row_old'].astype(np.int64).sort_values().to_numpy()
+    pairs = joined.loc[matched, ['row_old', 'row_new']].astype(np.int64).sort_values('row_new')
+
+    report_columns = DIFF_ITEM_COLUMNS + columns
+    added = new_df.iloc[added_rows][[col for col in report_columns if col in new_df.columns]].reset_index(drop=True)
+    removed = old_df.iloc[removed_rows][[col for col in report_columns if col in old_df.columns]].reset_index(drop=True)
+
+    # Compare the matched pairs column by column
+    old_values = {col: old_df[col].iloc[pairs['row_old'].to_numpy()].reset_index(drop=True) for col in columns}
+    new_values = {col: new_df[col].iloc[pairs['row_new'].to_numpy()].reset_index(drop=True) for col in columns}
+    differs = {col: _values_differ(old_values[col], new_values[col]) for col in columns}
+    changed_mask = np.logical_or.reduce(list(differs.values())) if differs else np.zeros(len(pairs), dtype=bool)
+
+    new_changed_rows = pairs['row_new'].to_numpy()[changed_mask]
+    changed = new_df.iloc[new_changed_rows][[col for col in DIFF_ITEM_COLUMNS if col in new_df.columns]]
+    changed = changed.reset_index(drop=True)
+    changed_labels = pd.Series("", index=changed.index, dtype=object)
+    for col in columns:
+        old_changed, new_changed = old_values[col][changed_mask], new_values[col][changed_mask]
+        changed[f"{col} (old)"] = old_changed.to_numpy()
+        changed[f"{col} (new)"] = new_changed.to_numpy()
+        changed[f"{col} Change"] = (pd.to_numeric(new_changed, errors='coerce') -
+                                    pd.to_numeric(old_changed, errors='coerce')).to_numpy()
+        column_changed = differs[col][changed_mask]
+        changed_labels = changed_labels.where(~column_changed, changed_labels + ", " + col)
+    changed['Changed Columns'] = changed_labels.str.removeprefix(", ")
+
+    # Counts per sheet
+    by_sheet = pd.concat([
+        pd.DataFrame({'Source_Sheet': added['Source_Sheet'], 'Added': 1}),
+        pd.DataFrame({'Source_Sheet': removed['Source_Sheet'], 'Removed': 1}),
+        pd.DataFrame({'Source_Sheet': changed['Source_Sheet'], 'Changed': 1}),
+    ], ignore_index=True)
+    by_sheet = by_sheet.groupby('Source_Sheet', sort=True)[['Added', 'Removed', 'Changed']].sum().astype(int).reset_index() \
+        if len(by_sheet) else pd.DataFrame(columns=['Source_Sheet', 'Added', 'Removed', 'Changed'])
+
+    summary_rows = [
+        ('Rows (old)', len(old_df)),
+        ('Rows (new)', len(new_df)),
+        ('Rows without Item Number (old)', len(old_df) - len(old_keys)),
+        ('Rows without Item Number (new)', len(new_df) - len(new_keys)),
+        ('Added items', len(added)),
+        ('Removed items', len(removed)),
+        ('Changed items', len(changed)),
+        ('Unchanged items', int(matched.sum()) - len(changed)),
+    ]
+    summary_rows += [(f"Changed {col}", int(differs[col].sum())) for col in columns]
+
+    return {
+        DIFF_SUMMARY: pd.DataFrame(summary_rows, columns=['Metric', 'Value']),
+        DIFF_BY_SHEET: by_sheet,
+        DIFF_ADDED: added,
+        DIFF_REMOVED: removed,
+        DIFF_CHANGED: changed,
+    }
+
+def write_diff_report(report: Dict[str, pd.DataFrame], target):
+    """Write a diff_results report to an xlsx path or binary buffer, one sheet per table"""
+    with pd.ExcelWriter(target, engine='openpyxl') as writer:
+        for sheet_name, report_df in report.items():
+            report_df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def main():
+    """Compare two processed results from the command line"""
+    parser = argparse.ArgumentParser(description="Show items added, removed or changed between two processing runs")
+    parser.add_argument('old', help="Earlier result (xlsx output, parquet or csv)")
+    parser.add_argument('new', help="Later result (xlsx output, parquet or csv)")
+    parser.add_argument('-o', '--output', help="Write the change report to this xlsx file")
+    parser.add_argument('--columns', default=','.join(DIFF_COLUMNS),
+                        help=f"Comma-separated columns to compare (default: {','.join(DIFF_COLUMNS)})")
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    old_df, new_df = load_result(args.old), load_result(args.new)
+    loaded_at = time.perf_counter()
+    report = diff_results(old_df, new_df, [col.strip() for col in args.columns.split(',') if col.strip()])
+    compared_at = time.perf_counter()
+
+    for _, row in report[DIFF_SUMMARY].iterrows():
+        print(f"{row['Metric']:<32}{row['Value']:>12,}")
+    print(f"\nLoaded in {loaded_at - started_at:.2f}s, compared in {compared_at - loaded_at:.2f}s")
+
+    if args.output:
+        write_diff_report(report, args.output)
+        print(f"Change report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
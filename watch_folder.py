@@ -0,0 +1,314 @@
+import argparse
+import fnmatch
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Tuple
+
+from excel_processor_web import ExcelProcessorWeb, OUTPUT_FORMATS, export_results
+from header_mapping import load_header_config
+from partition_output import PARTITION_KEYS, export_partitions
+
+# Workbook extensions picked up from the watch directory
+WATCHED_EXTENSIONS = ('.xlsx', '.xls')
+
+# Suffix added to output files; inputs carrying it are never processed
+OUTPUT_SUFFIX = '_processed'
+
+def output_paths(path: str, output_dir: str, output_format: str) -> Tuple[str, str]:
+    """Return the (output file, metrics file) paths for an input workbook"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    extension = OUTPUT_FORMATS[output_format][0]
+    return (os.path.join(output_dir, f"{stem}{OUTPUT_SUFFIX}{extension}"),
+            os.path.join(output_dir, f"{stem}{OUTPUT_SUFFIX}_metrics.json"))
+
+def run_job(path: str, output_dir: str, output_format: str, order_lookup: Dict[str, float], order_file: str,
+            header_config: Dict[str, Any] = None, partition_by: str = None) -> Dict[str, Any]:
+    """Process one main workbook in a worker and write its output and metrics"""
+    name = os.path.basename(path)
+    stem = os.path.splitext(name)[0]
+    output_path, metrics_path = output_paths(path, output_dir, output_format)
+
+    print(f"Processing {name}...")
+    started_at = time.time()
+    metrics = {
+        'input_file': path,
+        'order_file': order_file,
+        'started_at': started_at,
+    }
+
+    try:
+        processor = ExcelProcessorWeb(header_config=header_config)
+        processor.order_quantity_lookup = order_lookup
+        result = processor.process_files(path)
+        processed_at = time.time()
+        metrics['processing_seconds'] = round(processed_at - started_at, 4)
+        metrics['success'] = result['success']
+
+        if result['success']:
+            payload = export_results(result, output_format)
+            _write_atomic(output_path, payload)
+            metrics.update({
+                'output_file': output_path,
+                'output_bytes': len(payload),
+                'serialize_seconds': round(time.time() - processed_at, 4),
+                'total_items': result['total_items'],
+                'matched_items': result['matched_items'],
+                'match_rate': round(result['match_rate'], 2),
+            })
+
+            if partition_by is not None:
+                partition_dir = os.path.join(output_dir, f"{stem}{OUTPUT_SUFFIX}_by_{partition_by.lower()}")
+                # Jobs already run in parallel processes, so partitions are written in this one
+                manifest = export_partitions(
+                    result['combined_df'], partition_by, output_format, partition_dir, workers=1
+                )
+                metrics['partition_dir'] = partition_dir
+                metrics['partitions'] = len(manifest['partitions'])
+                metrics['partition_seconds'] = manifest['wall_seconds']
+
+            print(f"Finished {name}: {result['total_items']} items -> {os.path.basename(output_path)}")
+        else:
+            metrics['error'] = result['error']
+            print(f"Failed {name}: {result['error']}")
+
+    except Exception as e:
+        metrics['success'] = False
+        metrics['error'] = f'Processing error: {str(e)}'
+        print(f"Failed {name}: {str(e)}")
+
+    metrics['total_seconds'] = round(time.time() - started_at, 4)
+    _write_atomic(metrics_path, json.dumps(metrics, indent=2).encode('utf-8'))
+    return metrics
+
+def _write_atomic(path: str, data: bytes):
+    """Write data so readers never see a partially written file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class WatchFolderDaemon:
+    """Process workbooks dropped into a directory on worker processes sharing one warm order lookup"""
+
+    def __init__(self, watch_dir: str, output_dir: str, order_pattern: str = '*order*',
+                 workers: int = 2, settle_seconds: float = 2.0, poll_interval: float = 1.0,
+                 output_format: str = 'xlsx', header_config: Dict[str, Any] = None,
+                 partition_by: str = None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        if partition_by is not None and partition_by not in PARTITION_KEYS:
+            raise ValueError(f"Unsupported partition key: {partition_by}")
+
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.order_pattern = order_pattern.lower()
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.output_format = output_format
+        self.header_config = header_config
+        self.partition_by = partition_by
+
+        self.executor = self._new_executor()
+        self._lock = threading.Lock()
+        self._observed = {}   # path -> (signature, time the signature was first seen)
+        self._processed = {}  # path -> signature of the last submitted version
+        self._in_flight = set()
+
+        # Warm order lookup, parsed once and sent with every job
+        self.order_lookup = None
+        self.order_file = None
+        self.order_signature = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Parsing is CPU-bound Python, so jobs run in spawned worker processes; each job
+        # receives the warm order lookup with its arguments
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _replace_broken_executor(self, executor: ProcessPoolExecutor):
+        """Swap in a fresh pool after a worker died (e.g. killed for using too much memory)"""
+        with self._lock:
+            if self.executor is executor:
+                self.executor = self._new_executor()
+                print("Warning: a worker process died; restarted the worker pool")
+
+    def run(self):
+        """Poll the watch directory until interrupted"""
+        print(f"Watching {self.watch_dir} (order files: '{self.order_pattern}')")
+        print(f"Writing {self.output_format} outputs to {self.output_dir}")
+
+        try:
+            while True:
+                self.scan_once()
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            print("\nStopping watcher...")
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def scan_once(self):
+        """Check the watch directory once and start any work that is ready"""
+        now = time.time()
+        stable_orders = []
+        stable_mains = []
+
+        for path, signature in self._list_inputs().items():
+            previous = self._observed.get(path)
+            if previous is None or previous[0] != signature:
+                # New or still being written; wait for it to settle
+                self._observed[path] = (signature, now)
+                continue
+            if now - previous[1] < self.settle_seconds:
+                continue
+
+            if self._is_order_file(path):
+                stable_orders.append((signature[1], path, signature))
+            else:
+                stable_mains.append((path, signature))
+
+        # Forget files that were removed
+        for path in list(self._observed):
+            if not os.path.exists(path):
+                self._observed.pop(path, None)
+                self._processed.pop(path, None)
+
+        if stable_orders:
+            _, order_path, order_signature = max(stable_orders)
+            if (order_path, order_signature) != (self.order_file, self.order_signature):
+                self._load_order_file(order_path, order_signature)
+
+        if self.order_lookup is None:
+            return
+
+        for path, signature in stable_mains:
+            if self._processed.get(path) != signature:
+                self._submit(path, signature)
+
+    def _list_inputs(self) -> Dict[str, Tuple[int, float]]:
+        """Return {path: (size, mtime)} for candidate workbooks in the watch directory"""
+        inputs = {}
+        try:
+            entries = list(os.scandir(self.watch_dir))
+        except FileNotFoundError:
+            return inputs
+
+        for entry in entries:
+            name = entry.name
+            stem, extension = os.path.splitext(name)
+            if not entry.is_file() or extension.lower() not in WATCHED_EXTENSIONS:
+                continue
+            # Skip Excel lock files and our own outputs
+            if name.startswith('~$') or stem.endswith(OUTPUT_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            inputs[entry.path] = (stat.st_size, stat.st_mtime)
+        return inputs
+
+    def _is_order_file(self, path: str) -> bool:
+        return fnmatch.fnmatch(os.path.splitext(os.path.basename(path))[0].lower(), self.order_pattern)
+
+    def _load_order_file(self, path: str, signature: Tuple[int, float]):
+        """Parse the order file once and share the lookup with later jobs"""
+        processor = ExcelProcessorWeb(header_config=self.header_config)
+        if not processor.load_order_file(path):
+            print(f"Warning: could not load order file {os.path.basename(path)}; keeping previous lookup")
+            self.order_file, self.order_signature = path, signature
+            return
+
+        self.order_lookup = processor.order_quantity_lookup
+        self.order_file, self.order_signature = path, signature
+        print(f"Loaded order lookup from {os.path.basename(path)} ({len(self.order_lookup)} items)")
+
+        # Outputs depend on the order data, so every main file is due again
+        self._processed.clear()
+
+    def _submit(self, path: str, signature: Tuple[int, float]):
+        with self._lock:
+            if path in self._in_flight:
+                return
+            if len(self._in_flight) >= self.workers:
+                # Pool is busy; the file stays due and is picked up on a later scan
+                return
+            self._in_flight.add(path)
+
+        self._processed[path] = signature
+        order_file = self.order_file
+        job = (run_job, path, self.output_dir, self.output_format, self.order_lookup, order_file,
+               self.header_config, self.partition_by)
+        executor = self.executor
+        try:
+            try:
+                future = executor.submit(*job)
+            except BrokenProcessPool:
+                self._replace_broken_executor(executor)
+                executor = self.executor
+                future = executor.submit(*job)
+        except Exception as e:
+            # Leave the file due so a later scan tries again
+            with self._lock:
+                self._in_flight.discard(path)
+            self._processed.pop(path, None)
+            print(f"Warning: could not start {os.path.basename(path)}: {str(e)}")
+            return
+
+        future.add_done_callback(lambda done: self._job_done(path, order_file, done, executor))
+
+    def _job_done(self, path: str, order_file: str, future, executor: ProcessPoolExecutor):
+        error = None if future.cancelled() else future.exception()
+        if error is not None:
+            # The worker died before writing metrics; record the failure in its place
+            if isinstance(error, BrokenProcessPool):
+                self._replace_broken_executor(executor)
+            print(f"Failed {os.path.basename(path)}: worker process failed")
+            _write_atomic(output_paths(path, self.output_dir, self.output_format)[1], json.dumps({
+                'input_file': path,
+                'order_file': order_file,
+                'success': False,
+                'error': f'Worker process failed: {str(error) or type(error).__name__}',
+            }, indent=2).encode('utf-8'))
+
+        with self._lock:
+            self._in_flight.discard(path)
+
+def main():
+    """Run the watch-folder daemon from the command line"""
+    parser = argparse.ArgumentParser(description="Automatically process workbooks dropped into a folder")
+    parser.add_argument('watch_dir', help="Directory to watch for main and order workbooks")
+    parser.add_argument('output_dir', help="Directory for processed outputs and job metrics")
+    parser.add_argument('--order-pattern', default='*order*',
+                        help="Filename pattern (case-insensitive, no extension) identifying order files")
+    parser.add_argument('--workers', type=int, default=2, help="Workbooks processed in parallel")
+    parser.add_argument('--settle-seconds', type=float, default=2.0,
+                        help="How long a file must stay unchanged before it is processed")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between directory scans")
+    parser.add_argument('--format', dest='output_format', default='xlsx', choices=list(OUTPUT_FORMATS))
+    parser.add_argument('--header-config', help="JSON file with header aliases (see header_mapping.py)")
+    parser.add_argument('--partition-by', choices=PARTITION_KEYS,
+                        help="Also write one file per Model, Planner or Source_Sheet value")
+    args = parser.parse_args()
+
+    daemon = WatchFolderDaemon(
+        args.watch_dir,
+        args.output_dir,
+        order_pattern=args.order_pattern,
+        workers=args.workers,
+        settle_seconds=args.settle_seconds,
+        poll_interval=args.poll_interval,
+        output_format=args.output_format,
+        header_config=load_header_config(args.header_config) if args.header_config else None,
+        partition_by=args.partition_by
+    )
+    daemon.run()
+
+if __name__ == "__main__":
+    main()
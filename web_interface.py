@@ -1,12 +1,19 @@
 import streamlit as st
 import pandas as pd
-import os
-import tempfile
-from io import BytesIO
 import sys
+from io import BytesIO
 
 # Import your Excel processor
-from excel_processor_web import ExcelProcessorWeb
+from excel_processor_web import (
+    ExcelProcessorWeb, SheetFilter, SHARED_ORDER_CACHE, export_results,
+    UNMATCHED_SHEET_ITEMS, UNMATCHED_ORDER_ITEMS, UNMATCHED_BY_SHEET
+)
+from result_search import ResultSearchIndex, SEARCH_FIELDS
+from partition_output import PARTITION_KEYS, export_partitions_zip
+from run_diff import (
+    DIFF_SUMMARY, DIFF_BY_SHEET, DIFF_ADDED, DIFF_REMOVED, DIFF_CHANGED,
+    diff_results, load_result, write_diff_report
+)
 
 def main():
     st.set_page_config(
@@ -18,9 +25,9 @@ def main():
     st.title("📊 Excel Data Processor with Order Quantities")
     st.markdown("---")
     
-    # Initialize session state
+    # Initialize session state; parsed order files are shared across sessions
     if 'processor' not in st.session_state:
-        st.session_state.processor = ExcelProcessorWeb()
+        st.session_state.processor = ExcelProcessorWeb(order_cache=SHARED_ORDER_CACHE)
     
     # Instructions at the top
     with st.expander("📖 How to Use This Tool", expanded=False):
@@ -79,6 +86,40 @@ def main():
     if main_file is not None and order_file is not None:
         st.markdown("---")
         
+        # Optional filters: non-matching sheets are skipped before their tables are read
+        with st.expander("🔎 Filter Sheets (optional)", expanded=False):
+            filter_col1, filter_col2 = st.columns(2)
+            with filter_col1:
+                model_pattern = st.text_input(
+                    "Model pattern",
+                    help="Only process sheets whose Model matches, e.g. 'X100*' (wildcards * and ?)"
+                )
+                sheet_pattern = st.text_input(
+                    "Sheet name pattern",
+                    help="Only process sheets whose name matches, e.g. 'NPI-*'"
+                )
+            with filter_col2:
+                b2c_date_from = st.date_input("B2C Date from", value=None)
+                b2c_date_to = st.date_input("B2C Date to", value=None)
+        
+        # How the original workbook's sheets appear in the Excel download
+        output_layout = st.radio(
+            "Excel download layout",
+            ["Keep original Summary", "Keep all original sheets", "Rewrite Summary (values only)"],
+            horizontal=True,
+            help="Keeping original sheets copies them unchanged (formatting, formulas, links) and only "
+                 "adds the new sheets, which is also faster. Needs an .xlsx main file."
+        )
+        
+        sheet_filter = None
+        if model_pattern or sheet_pattern or b2c_date_from or b2c_date_to:
+            sheet_filter = SheetFilter(
+                model_pattern=model_pattern.strip() or None,
+                sheet_pattern=sheet_pattern.strip() or None,
+                b2c_date_from=b2c_date_from,
+                b2c_date_to=b2c_date_to
+            )
+        
         # Add a big, prominent process button
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
@@ -95,23 +136,15 @@ def main():
             status_text = st.empty()
             
             try:
-                # Step 1: Save files temporarily
-                status_text.text("📁 Saving uploaded files...")
-                progress_bar.progress(10)
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_main:
-                    tmp_main.write(main_file.getvalue())
-                    main_path = tmp_main.name
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_order:
-                    tmp_order.write(order_file.getvalue())
-                    order_path = tmp_order.name
-                
-                # Step 2: Process the files
+                # Process the uploaded files in place (no temp files or copies)
                 status_text.text("⚙️ Processing files...")
                 progress_bar.progress(30)
                 
-                result = st.session_state.processor.process_files(main_path, order_path)
+                # When the original Summary is copied as stored, only its preview rows are read
+                append_original = output_layout.startswith("Keep") and main_file.name.lower().endswith('.xlsx')
+                result = st.session_state.processor.process_files(
+                    main_file, order_file, sheet_filter, summary_rows=10 if append_original else None
+                )
                 progress_bar.progress(80)
                 
                 if result['success']:
@@ -120,6 +153,13 @@ def main():
                     
                     st.success("🎉 Files processed successfully!")
                     
+                    # Index the result once so searches stay fast across reruns
+                    st.session_state.search_index = ResultSearchIndex(result['combined_df'])
+                    st.session_state.search_page = 0
+                    st.session_state.result_name = main_file.name.split('.')[0]
+                    st.session_state.pop('partition_zip', None)
+                    st.session_state.pop('run_diff', None)
+                    
                     # Display summary in attractive cards
                     st.subheader("📈 Processing Summary")
                     
@@ -155,18 +195,19 @@ def main():
                     st.markdown("---")
                     st.subheader("📥 Download Results")
                     
-                    # Create Excel file in memory
-                    output_buffer = BytesIO()
-                    with pd.ExcelWriter(output_buffer, engine='openpyxl') as writer:
-                        result['summary_df'].to_excel(writer, sheet_name='Summary', index=False)
-                        result['combined_df'].to_excel(writer, sheet_name='Combined', index=False)
+                    # Create Excel file in memory (Summary, Combined and aggregate reports)
+                    if append_original:
+                        keep_sheets = None if output_layout == "Keep all original sheets" else ['Summary']
+                        output_data = export_results(result, 'xlsx', original=main_file, keep_sheets=keep_sheets)
+                    else:
+                        output_data = export_results(result, 'xlsx')
                     
                     # Download button
                     col1, col2, col3 = st.columns([1, 2, 1])
                     with col2:
                         st.download_button(
                             label="📥 Download Processed Excel File",
-                            data=output_buffer.getvalue(),
+                            data=output_data,
                             file_name=f"{main_file.name.split('.')[0]}_processed.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                             use_container_width=True
@@ -177,7 +218,9 @@ def main():
                     st.subheader("👀 Data Preview")
                     
                     # Show tabs for different views
-                    tab1, tab2, tab3 = st.tabs(["📊 Combined Data", "📋 Summary Sheet", "🔍 Sample Matches"])
+                    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+                        "📊 Combined Data", "📋 Summary Sheet", "🔍 Sample Matches", "📈 Aggregates", "🧾 Reconciliation"
+                    ])
                     
                     with tab1:
                         st.write("**First 20 rows of combined data:**")
@@ -188,7 +231,7 @@ def main():
                         )
                         
                         if len(result['combined_df']) > 20:
-                            st.info(f"Showing first 20 rows out of {len(result['combined_df']):,} total rows")
+                            st.info(f"Showing first 20 rows out of {len(result['combined_df']):,} total rows - use Search Results below to find specific items")
                     
                     with tab2:
                         st.write("**Summary sheet data:**")
@@ -222,6 +265,38 @@ def main():
                         if not items_without_qty.empty:
                             st.write("❌ **Items WITHOUT order quantities:**")
                             st.dataframe(items_without_qty, use_container_width=True)
+                    
+                    with tab4:
+                        st.write("**Ordered Qty vs Oracle On Hand:**")
+                        for sheet_name, report_df in result['aggregate_reports'].items():
+                            st.write(f"**{sheet_name}**")
+                            st.dataframe(report_df, use_container_width=True)
+                    
+                    with tab5:
+                        reconciliation = result['reconciliation']
+                        unmatched_sheet_items = reconciliation[UNMATCHED_SHEET_ITEMS]
+                        unmatched_order_items = reconciliation[UNMATCHED_ORDER_ITEMS]
+                        
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.metric(
+                                label="Sheet items not in order file",
+                                value=f"{len(unmatched_sheet_items):,}"
+                            )
+                        with col2:
+                            st.metric(
+                                label="Order items not in any sheet",
+                                value=f"{len(unmatched_order_items):,}"
+                            )
+                        
+                        st.write("**Unmatched items per sheet:**")
+                        st.dataframe(reconciliation[UNMATCHED_BY_SHEET], use_container_width=True)
+                        
+                        st.write("❌ **Sheet items with no order quantity:**")
+                        st.dataframe(unmatched_sheet_items, use_container_width=True, height=300)
+                        
+                        st.write("📦 **Order items that appear in no sheet:**")
+                        st.dataframe(unmatched_order_items, use_container_width=True, height=300)
                 
                 else:
                     status_text.text("❌ Processing failed")
@@ -245,25 +320,17 @@ def main():
                        - Verify that your files are valid Excel files (.xlsx or .xls)
                        - Check that sheets contain actual data, not just headers
                     """)
-                
-                # Clean up temp files
-                try:
-                    os.unlink(main_path)
-                    os.unlink(order_path)
-                except:
-                    pass  # Ignore cleanup errors
                     
             except Exception as e:
                 status_text.text("❌ An unexpected error occurred")
                 progress_bar.progress(0)
                 st.error(f"❌ An unexpected error occurred: {str(e)}")
-                
-                # Clean up temp files even on error
-                try:
-                    os.unlink(main_path)
-                    os.unlink(order_path)
-                except:
-                    pass
+    
+    # Search the most recent result (kept in session state across reruns)
+    if 'search_index' in st.session_state:
+        render_partition_download(st.session_state.search_index.combined_df, st.session_state.result_name)
+        render_run_diff(st.session_state.search_index.combined_df, st.session_state.result_name)
+        render_search(st.session_state.search_index)
     
     # Footer
     st.markdown("---")
@@ -276,5 +343,150 @@ def main():
         unsafe_allow_html=True
     )
 
+def render_partition_download(combined_df: pd.DataFrame, result_name: str):
+    """Offer the combined result split into one file per Model, Planner or sheet"""
+    st.markdown("---")
+    st.subheader("📂 Download Split Files")
+    
+    with st.form("partition_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            partition_key = st.selectbox("Split by", PARTITION_KEYS)
+        with col2:
+            output_format = st.selectbox("File format", ["xlsx", "csv", "parquet"])
+        prepare = st.form_submit_button("📦 Prepare Split Files")
+    
+    if prepare:
+        with st.spinner("Writing one file per partition..."):
+            try:
+                st.session_state.partition_zip = (
+                    partition_key,
+                    export_partitions_zip(combined_df, partition_key, output_format)
+                )
+            except Exception as e:
+                st.error(f"❌ Could not create split files: {str(e)}")
+    
+    if 'partition_zip' in st.session_state:
+        partition_key, zip_data = st.session_state.partition_zip
+        st.download_button(
+            label=f"📥 Download files split by {partition_key} (zip with manifest)",
+            data=zip_data,
+            file_name=f"{result_name}_by_{partition_key.lower()}.zip",
+            mime="application/zip",
+            use_container_width=True
+        )
+
+def render_run_diff(combined_df: pd.DataFrame, result_name: str):
+    """Compare the current result with an earlier run's output"""
+    st.markdown("---")
+    st.subheader("🔁 Compare with a Previous Run")
+    
+    with st.form("run_diff_form"):
+        previous_file = st.file_uploader(
+            "Previous result",
+            type=['xlsx', 'parquet', 'csv'],
+            help="An earlier processed output (its Combined sheet), or a parquet/CSV export"
+        )
+        compare = st.form_submit_button("🔁 Compare Runs")
+    
+    if compare and previous_file is not None:
+        with st.spinner("Comparing runs..."):
+            try:
+                report = diff_results(load_result(previous_file), combined_df)
+                buffer = BytesIO()
+                write_diff_report(report, buffer)
+                st.session_state.run_diff = (previous_file.name, report, buffer.getvalue())
+            except Exception as e:
+                st.error(f"❌ Could not compare runs: {str(e)}")
+    
+    if 'run_diff' in st.session_state:
+        previous_name, report, report_data = st.session_state.run_diff
+        counts = dict(zip(report[DIFF_SUMMARY]['Metric'], report[DIFF_SUMMARY]['Value']))
+        st.caption(f"Compared with {previous_name}")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Added", f"{counts['Added items']:,}")
+        with col2:
+            st.metric("Removed", f"{counts['Removed items']:,}")
+        with col3:
+            st.metric("Changed", f"{counts['Changed items']:,}")
+        with col4:
+            st.metric("Unchanged", f"{counts['Unchanged items']:,}")
+        
+        with st.expander("📋 Change Details"):
+            st.dataframe(report[DIFF_BY_SHEET], use_container_width=True)
+            for sheet_name in (DIFF_CHANGED, DIFF_ADDED, DIFF_REMOVED):
+                st.write(f"**{sheet_name}:**")
+                st.dataframe(report[sheet_name].head(1000), use_container_width=True, height=300)
+        
+        st.download_button(
+            label="📥 Download Change Report (Excel)",
+            data=report_data,
+            file_name=f"{result_name}_changes.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True
+        )
+
+def render_search(search_index: ResultSearchIndex, page_size: int = 50):
+    """Search box over the processed result with paginated matches"""
+    st.markdown("---")
+    st.subheader("🔍 Search Results")
+    
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        query = st.text_input(
+            "Search",
+            key="search_query",
+            placeholder="Item Number, Model, Planner or sheet name",
+            help="Case-insensitive; leave empty to browse all rows"
+        )
+    with col2:
+        field = st.selectbox("Field", ["All fields"] + SEARCH_FIELDS, key="search_field")
+    with col3:
+        mode = st.radio("Match", ["Starts with", "Contains"], key="search_mode")
+    
+    # Start from the first page whenever the search changes
+    search_key = (query, field, mode)
+    if st.session_state.get('search_key') != search_key:
+        st.session_state.search_key = search_key
+        st.session_state.search_page = 0
+    
+    result = search_index.search(
+        query,
+        field=None if field == "All fields" else field,
+        mode='prefix' if mode == "Starts with" else 'substring',
+        page=st.session_state.search_page,
+        page_size=page_size
+    )
+    st.session_state.search_page = result['page']
+    
+    if result['total_matches'] == 0:
+        st.warning("No matching items found")
+        return
+    
+    first_row = result['page'] * page_size + 1
+    last_row = first_row + len(result['rows']) - 1
+    st.caption(
+        f"Showing {first_row:,}-{last_row:,} of {result['total_matches']:,} matches "
+        f"({result['elapsed_ms']:.1f} ms)"
+    )
+    st.dataframe(result['rows'], use_container_width=True, height=400)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("⬅️ Previous", disabled=result['page'] == 0, use_container_width=True):
+            st.session_state.search_page -= 1
+            st.rerun()
+    with col2:
+        st.markdown(
+            f"<div style='text-align: center;'>Page {result['page'] + 1:,} of {result['page_count']:,}</div>",
+            unsafe_allow_html=True
+        )
+    with col3:
+        if st.button("Next ➡️", disabled=result['page'] >= result['page_count'] - 1, use_container_width=True):
+            st.session_state.search_page += 1
+            st.rerun()
+
 if __name__ == "__main__":
     main()
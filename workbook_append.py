@@ -0,0 +1,419 @@
+import math
+import os
+import posixpath
+import re
+import struct
+import zipfile
+from datetime import date, datetime
+from io import BytesIO
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+from urllib.parse import unquote
+from xml.sax.saxutils import escape, unescape
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+# Zip record layouts (see APPNOTE.TXT): local file header, central directory
+# file header and end of central directory record
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_END_SIGNATURE = b'PK\x05\x06'
+_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+WORKSHEET_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+_RELATIONSHIP_TYPES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_SPREADSHEET_NAMESPACE = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+# XML 1.0 cannot hold these control characters; Excel drops them too
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_INVALID_SHEET_NAME_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+_RELATIONSHIP_TAG = re.compile(r'<(?:\w+:)?Relationship\b[^>]*>')
+_OVERRIDE_TAG = re.compile(r'<(?:\w+:)?Override\b[^>]*>')
+_SHEET_TAG = re.compile(r'<(?:\w+:)?sheet\b[^>]*?(?:/>|>\s*</(?:\w+:)?sheet>)')
+_DEFINED_NAME_TAG = re.compile(r'<((?:\w+:)?)definedName\b([^>]*)>(.*?)</\1definedName>', re.DOTALL)
+_ATTRIBUTE = re.compile(r'([\w:]+)\s*=\s*"([^"]*)"')
+
+class _ZipEntry:
+    """One member of a zip archive, located by its central directory record"""
+
+    def __init__(self, name: str, central_record: bytes, header_offset: int, compress_size: int, flag_bits: int):
+        self.name = name
+        self.central_record = central_record
+        self.header_offset = header_offset
+        self.compress_size = compress_size
+        self.flag_bits = flag_bits
+
+def _read_entries(f) -> List[_ZipEntry]:
+    """Parse the central directory of a zip file without decompressing anything"""
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    tail_size = min(file_size, _END_RECORD.size + 0xFFFF)
+    f.seek(file_size - tail_size)
+    tail = f.read(tail_size)
+
+    end_at = tail.rfind(_END_SIGNATURE)
+    if end_at < 0:
+        raise zipfile.BadZipFile("Not an xlsx workbook (zip end record not found)")
+    _, _, _, _, entry_count, directory_size, directory_offset, _ = _END_RECORD.unpack_from(tail, end_at)
+    if entry_count == 0xFFFF or directory_offset == _ZIP64_LIMIT:
+        raise ValueError("ZIP64 workbooks are not supported for appending sheets")
+
+    f.seek(directory_offset)
+    directory = f.read(directory_size)
+    entries = []
+    position = 0
+    for _ in range(entry_count):
+        fields = _CENTRAL_HEADER.unpack_from(directory, position)
+        if fields[0] != _CENTRAL_SIGNATURE:
+            raise zipfile.BadZipFile("Corrupt zip central directory")
+        flag_bits, compress_size, file_size_field = fields[5], fields[10], fields[11]
+        name_length, extra_length, comment_length, header_offset = fields[12], fields[13], fields[14], fields[18]
+        if _ZIP64_LIMIT in (compress_size, file_size_field, header_offset):
+            raise ValueError("ZIP64 workbooks are not supported for appending sheets")
+
+        record_size = _CENTRAL_HEADER.size + name_length + extra_length + comment_length
+        raw_name = directory[position + _CENTRAL_HEADER.size:position + _CENTRAL_HEADER.size + name_length]
+        name = raw_name.decode('utf-8' if flag_bits & 0x800 else 'cp437')
+        entries.append(_ZipEntry(name, directory[position:position + record_size], header_offset, compress_size, flag_bits))
+        position += record_size
+
+    return entries
+
+def _copy_entry(f, entry: _ZipEntry, out) -> int:
+    """Copy an entry's local header and still-compressed data to out; return bytes written"""
+    f.seek(entry.header_offset)
+    header = f.read(_LOCAL_HEADER.size)
+    name_length, extra_length = _LOCAL_HEADER.unpack(header)[10:12]
+    length = _LOCAL_HEADER.size + name_length + extra_length + entry.compress_size
+
+    # Sizes follow the data in a data descriptor when bit 3 is set
+    if entry.flag_bits & 0x08:
+        f.seek(entry.header_offset + length)
+        length += 16 if f.read(4) == _DESCRIPTOR_SIGNATURE else 12
+
+    f.seek(entry.header_offset)
+    remaining = length
+    while remaining:
+        chunk = f.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated zip entry: {entry.name}")
+        out.write(chunk)
+        remaining -= len(chunk)
+    return length
+
+def _attributes(tag: str) -> Dict[str, str]:
+    return {name: unescape(value, {'&quot;': '"', '&apos;': "'"}) for name, value in _ATTRIBUTE.findall(tag)}
+
+def _rels_path(part: str) -> str:
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, '_rels', name + '.rels')
+
+def _resolve_target(source_part: str, target: str) -> str:
+    target = unquote(target)
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+def _relationships(rels_xml: str) -> List[Dict[str, str]]:
+    return [_attributes(tag) for tag in _RELATIONSHIP_TAG.findall(rels_xml)]
+
+def _sheet_xml_rows(df: pd.DataFrame, date_style: int, datetime_style: int, epoch: datetime) -> Iterator[str]:
+    """Yield the <row> elements of a worksheet holding df with a header row"""
+    letters = [get_column_letter(col_idx + 1) for col_idx in range(len(df.columns))]
+
+    def cell(reference: str, value: Any) -> str:
+        if isinstance(value, str):
+            if not value:
+                return ''
+            text = escape(_ILLEGAL_XML_CHARS.sub('', value))
+            space = ' xml:space="preserve"' if text != text.strip() else ''
+            return f'<c r="{reference}" t="inlineStr"><is><t{space}>{text}</t></is></c>'
+        if isinstance(value, (bool, np.bool_)):
+            return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, np.integer)):
+            return f'<c r="{reference}"><v>{int(value)}</v></c>'
+        if isinstance(value, (float, np.floating)):
+            if math.isnan(value):
+                return ''
+            if math.isinf(value):
+                return cell(reference, str(value))
+            return f'<c r="{reference}"><v>{float(value)!r}</v></c>'
+        if value is None or value is pd.NaT or value is pd.NA:
+            return ''
+        if isinstance(value, (datetime, date)):
+            if not isinstance(value, datetime):
+                value = datetime(value.year, value.month, value.day)
+            value = value.replace(tzinfo=None)
+            serial = (value - epoch).total_seconds() / 86400
+            style = date_style if serial == int(serial) else datetime_style
+            if style < 0:
+                return cell(reference, value.isoformat(sep=' '))
+            return f'<c r="{reference}" s="{style}"><v>{serial!r}</v></c>'
+        return cell(reference, str(value))
+
+    yield '<row r="1">' + ''.join(cell(f"{letter}1", str(name)) for letter, name in zip(letters, df.columns)) + '</row>'
+    for row_number, values in enumerate(df.itertuples(index=False, name=None), start=2):
+        yield f'<row r="{row_number}">' + ''.join(
+            cell(f"{letter}{row_number}", value) for letter, value in zip(letters, values)
+        ) + '</row>'
+
+def _write_sheet_part(archive: zipfile.ZipFile, part: str, df: pd.DataFrame, date_style: int,
+                      datetime_style: int, epoch: datetime) -> bool:
+    """Stream df into a new worksheet part; return True if any date cell was written"""
+    last_cell = f"{get_column_letter(max(len(df.columns), 1))}{len(df) + 1}"
+    uses_dates = any(
+        pd.api.types.is_datetime64_any_dtype(dtype) or
+        (dtype == object and df[column].map(lambda value: isinstance(value, (datetime, date))).any())
+        for column, dtype in df.dtypes.items()
+    )
+
+    with archive.open(part, 'w', force_zip64=False) as stream:
+        stream.write(
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<worksheet xmlns="{_SPREADSHEET_NAMESPACE}"><dimension ref="A1:{last_cell}"/><sheetData>'.encode('utf-8')
+        )
+        batch = []
+        for row_xml in _sheet_xml_rows(df, date_style, datetime_style, epoch):
+            batch.append(row_xml)
+            if len(batch) >= 10000:
+                stream.write(''.join(batch).encode('utf-8'))
+                batch = []
+        stream.write((''.join(batch) + '</sheetData></worksheet>').encode('utf-8'))
+
+    return uses_dates
+
+def _add_date_styles(styles_xml: str) -> Tuple[str, int]:
+    """Append date and date-time cell formats; return (styles XML, index of the first)"""
+    match = re.search(r'<((?:\w+:)?)cellXfs\b([^>]*)>(.*?)</\1cellXfs>', styles_xml, re.DOTALL)
+    if match is None:
+        raise ValueError("Workbook styles have no cellXfs")
+    prefix, attributes, body = match.groups()
+    first_index = len(re.findall(r'<(?:\w+:)?xf\b', body))
+
+    new_formats = ''.join(
+        f'<{prefix}xf numFmtId="{number_format}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        for number_format in (14, 22)  # built-in m/d/yyyy and m/d/yyyy h:mm
+    )
+    attributes = re.sub(r'\bcount="\d+"', f'count="{first_index + 2}"', attributes)
+    replacement = f'<{prefix}cellXfs{attributes}>{body}{new_formats}</{prefix}cellXfs>'
+    return styles_xml[:match.start()] + replacement + styles_xml[match.end():], first_index
+
+def append_sheets(original, new_sheets: Dict[str, pd.DataFrame], target,
+                  keep_sheets: Optional[Iterable[str]] = ('Summary',)):
+    """Copy an xlsx workbook with new sheets added; keep_sheets (all when None) are carried over unparsed"""
+    seen_names = set()
+    for name in new_sheets:
+        if not name or len(name) > 31 or _INVALID_SHEET_NAME_CHARS.search(name):
+            raise ValueError(f"Invalid sheet name: {name!r}")
+        if name.casefold() in seen_names:
+            raise ValueError(f"Duplicate sheet name: {name!r}")
+        seen_names.add(name.casefold())
+
+    own_source = isinstance(original, (str, os.PathLike))
+    f = open(original, 'rb') if own_source else original
+    try:
+        entries = _read_entries(f)
+        f.seek(0)
+        with zipfile.ZipFile(f) as source:
+            plan = _plan_changes(source, new_sheets, keep_sheets)
+            updated = plan['updated']
+
+            def read(name):
+                return updated[name] if name in updated else source.read(name).decode('utf-8')
+
+            part_names = {entry.name for entry in entries} | {part for part, _ in plan['new_parts']}
+            kept = _reachable_parts(part_names, read)
+            updated['[Content_Types].xml'] = _OVERRIDE_TAG.sub(
+                lambda match: match.group(0)
+                if unquote(_attributes(match.group(0)).get('PartName', '')).lstrip('/') in kept else '',
+                updated['[Content_Types].xml']
+            )
+
+        # Only new and edited parts are compressed; everything else is copied as stored
+        staged = BytesIO()
+        with zipfile.ZipFile(staged, 'w', zipfile.ZIP_DEFLATED) as archive:
+            uses_dates = False
+            for part, df in plan['new_parts']:
+                uses_dates |= _write_sheet_part(archive, part, df, *plan['date_styles'], plan['epoch'])
+            if uses_dates:
+                updated[plan['styles_part']] = plan['styles_with_dates']
+            for name, text in updated.items():
+                archive.writestr(name, text)
+        staged_entries = {entry.name: entry for entry in _read_entries(staged)}
+
+        own_target = isinstance(target, (str, os.PathLike))
+        out = open(target, 'wb') if own_target else target
+        try:
+            sources = [(staged, staged_entries[entry.name]) if entry.name in updated else (f, entry)
+                       for entry in entries if entry.name in kept]
+            sources += [(staged, staged_entries[part]) for part, _ in plan['new_parts']]
+            _write_archive(sources, out)
+        finally:
+            if own_target:
+                out.close()
+    finally:
+        if own_source:
+            f.close()
+
+def _reachable_parts(part_names: set, read) -> set:
+    """Parts reachable through relationships from the package root, plus their .rels parts"""
+    kept = {'[Content_Types].xml'}
+    pending = ['']
+    while pending:
+        part = pending.pop()
+        rels_part = '_rels/.rels' if part == '' else _rels_path(part)
+        if part:
+            kept.add(part)
+        if rels_part not in part_names:
+            continue
+        kept.add(rels_part)
+        for relationship in _relationships(read(rels_part)):
+            if relationship.get('TargetMode') == 'External':
+                continue
+            target = _resolve_target(part, relationship.get('Target', ''))
+            if target in part_names and target not in kept:
+                pending.append(target)
+    return kept
+
+def _plan_changes(source: zipfile.ZipFile, new_sheets: Dict[str, pd.DataFrame],
+                  keep_sheets: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Work out the edited package parts and where the new worksheets go"""
+    names = set(source.namelist())
+    workbook_part = next(
+        (_resolve_target('', rel['Target']) for rel in _relationships(source.read('_rels/.rels').decode('utf-8'))
+         if rel.get('Type', '').endswith('/officeDocument')),
+        'xl/workbook.xml'
+    )
+    workbook_dir = posixpath.dirname(workbook_part)
+    workbook_rels_part = _rels_path(workbook_part)
+    workbook_xml = source.read(workbook_part).decode('utf-8')
+    workbook_rels = source.read(workbook_rels_part).decode('utf-8')
+    content_types = source.read('[Content_Types].xml').decode('utf-8')
+    relationships = _relationships(workbook_rels)
+
+    # Attribute holding the relationship id on <sheet> elements (usually r:id)
+    rel_prefix = re.search(r'xmlns:(\w+)="[^"]*/officeDocument/2006/relationships"', workbook_xml)
+    rel_id_attribute = f"{rel_prefix.group(1)}:id" if rel_prefix else 'r:id'
+
+    sheet_tags = list(_SHEET_TAG.finditer(workbook_xml))
+    sheets = [_attributes(tag.group(0)) for tag in sheet_tags]
+    # Sheet names are case-insensitive in Excel
+    replaced = {name.casefold() for name in new_sheets}
+    keep = None if keep_sheets is None else {name.casefold() for name in keep_sheets}
+    dropped_names = {sheet['name'] for sheet in sheets
+                     if sheet['name'].casefold() in replaced or
+                     (keep is not None and sheet['name'].casefold() not in keep)}
+    kept_positions = [position for position, sheet in enumerate(sheets) if sheet['name'] not in dropped_names]
+    if not kept_positions and not new_sheets:
+        raise ValueError("The output workbook would have no sheets")
+
+    # Remove dropped sheets, and the calculation chain since it lists their cells
+    removed_rel_ids = {sheet.get(rel_id_attribute) for sheet in sheets if sheet['name'] in dropped_names}
+    if dropped_names:
+        removed_rel_ids |= {rel.get('Id') for rel in relationships if rel.get('Type', '').endswith('/calcChain')}
+        for tag, sheet in reversed(list(zip(sheet_tags, sheets))):
+            if sheet['name'] in dropped_names:
+                workbook_xml = workbook_xml[:tag.start()] + workbook_xml[tag.end():]
+        workbook_xml = _update_defined_names(workbook_xml, kept_positions, dropped_names)
+        # Sheet positions changed; open on the first tab
+        workbook_xml = re.sub(r'\s(?:activeTab|firstSheet)="\d+"', '', workbook_xml)
+    workbook_rels = _RELATIONSHIP_TAG.sub(
+        lambda match: '' if _attributes(match.group(0)).get('Id') in removed_rel_ids else match.group(0),
+        workbook_rels
+    )
+
+    # New worksheets: unused part names, relationship ids and sheet ids
+    rel_numbers = [int(match.group(1)) for match in
+                   (re.fullmatch(r'rId(\d+)', rel.get('Id', '')) for rel in relationships) if match]
+    next_rel = max(rel_numbers, default=0) + 1
+    next_sheet_id = max((int(sheet.get('sheetId', 0)) for sheet in sheets), default=0) + 1
+    sheet_prefix = re.search(r'<((?:\w+:)?)sheets\b', workbook_xml).group(1)
+
+    new_parts, sheet_xml, rel_xml, override_xml = [], [], [], []
+    part_number = 1
+    for name, df in new_sheets.items():
+        while posixpath.join(workbook_dir, f"worksheets/sheet{part_number}.xml") in names:
+            part_number += 1
+        part = posixpath.join(workbook_dir, f"worksheets/sheet{part_number}.xml")
+        names.add(part)
+        new_parts.append((part, df))
+
+        rel_id = f"rId{next_rel}"
+        next_rel += 1
+        sheet_xml.append(f'<{sheet_prefix}sheet name="{escape(name, {chr(34): "&quot;"})}" '
+                         f'sheetId="{next_sheet_id}" {rel_id_attribute}="{rel_id}"/>')
+        next_sheet_id += 1
+        rel_xml.append(f'<Relationship Id="{rel_id}" Type="{_RELATIONSHIP_TYPES}/worksheet" '
+                       f'Target="{posixpath.relpath(part, workbook_dir or ".")}"/>')
+        override_xml.append(f'<Override PartName="/{part}" ContentType="{WORKSHEET_CONTENT_TYPE}"/>')
+
+    def insert_before(closing_tag, xml, additions):
+        return re.sub(r'(</(?:\w+:)?' + closing_tag + '>)', lambda match: ''.join(additions) + match.group(1),
+                      xml, count=1)
+
+    # Date cell formats, written to the styles only if a new sheet holds dates
+    styles_part = next((_resolve_target(workbook_part, rel['Target']) for rel in relationships
+                        if rel.get('Type', '').endswith('/styles')), None)
+    styles_with_dates, date_styles = None, (-1, -1)
+    if styles_part in names:
+        styles_with_dates, first_style = _add_date_styles(source.read(styles_part).decode('utf-8'))
+        date_styles = (first_style, first_style + 1)
+
+    return {
+        'updated': {
+            workbook_part: insert_before('sheets', workbook_xml, sheet_xml),
+            workbook_rels_part: insert_before('Relationships', workbook_rels, rel_xml),
+            '[Content_Types].xml': insert_before('Types', content_types, override_xml),
+        },
+        'new_parts': new_parts,
+        'styles_part': styles_part,
+        'styles_with_dates': styles_with_dates,
+        'date_styles': date_styles,
+        'epoch': datetime(1904, 1, 1) if re.search(r'\bdate1904="(?:1|true)"', workbook_xml) else datetime(1899, 12, 30),
+    }
+
+def _update_defined_names(workbook_xml: str, kept_positions: List[int], dropped_names: set) -> str:
+    """Drop names scoped to or referring to dropped sheets and renumber localSheetId"""
+    new_positions = {old: new for new, old in enumerate(kept_positions)}
+    references = [re.compile(r"(?:'" + re.escape(name.replace("'", "''")) + r"'|(?<![\w.])" + re.escape(name) + r")!")
+                  for name in dropped_names]
+
+    def update(match):
+        prefix, attributes, text = match.groups()
+        local_sheet = re.search(r'\blocalSheetId="(\d+)"', attributes)
+        if local_sheet is not None:
+            position = new_positions.get(int(local_sheet.group(1)))
+            if position is None:
+                return ''
+            attributes = attributes.replace(local_sheet.group(0), f'localSheetId="{position}"')
+        if any(reference.search(unescape(text)) for reference in references):
+            return ''
+        return f'<{prefix}definedName{attributes}>{text}</{prefix}definedName>'
+
+    workbook_xml = _DEFINED_NAME_TAG.sub(update, workbook_xml)
+    # An empty <definedNames> element is not allowed
+    return re.sub(r'<((?:\w+:)?)definedNames\b[^>]*>\s*</\1definedNames>', '', workbook_xml)
+
+def _write_archive(sources: List[Tuple[Any, _ZipEntry]], out):
+    """Write a zip made of existing entries, copied without recompression"""
+    central_records = []
+    offset = 0
+    for source_file, entry in sources:
+        record = bytearray(entry.central_record)
+        struct.pack_into('<L', record, 42, offset)
+        central_records.append(bytes(record))
+        offset += _copy_entry(source_file, entry, out)
+        if offset > _ZIP64_LIMIT:
+            raise ValueError("Output workbook exceeds 4 GB")
+    if len(central_records) >= 0xFFFF:
+        raise ValueError("Output workbook has too many parts")
+
+    directory = b''.join(central_records)
+    out.write(directory)
+    out.write(_END_RECORD.pack(_END_SIGNATURE, 0, 0, len(central_records), len(central_records),
+                               len(directory), offset, 0))